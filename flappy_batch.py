@@ -0,0 +1,246 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+from flappy_core import (FlappySim, bird_x, bird_width, bird_height, bird_start_y, ground_y, gravity,
+                         flap_strength, pipe_gap, pipe_width, pipe_speed, pipe_interval, gap_range,
+                         screen_width)
+
+# Flappy for N birds at once, all flying through the same pipes. Bird
+# positions, velocities, alive flags and scores are arrays and a step
+# updates them all with a handful of array operations. The pipes are shared,
+# so they stay a short Python list. With the same seed every bird plays
+# exactly the game flappy_core.FlappySim would with the same inputs, solving
+# a run of frames per step the same way.
+
+never = 1 << 40   # frame offset for "does not happen"
+
+
+def _heights(y, velocity, s):
+    return y + velocity * s + gravity * (s * (s + 1) // 2)
+
+
+def _first(y, velocity, level, lo, hi, below, inclusive):
+    # flappy_core._first for every bird at once, with never for no frame
+    def beyond(s):
+        h = _heights(y, velocity, s)
+        if below:
+            return h <= level if inclusive else h < level
+        return h >= level if inclusive else h > level
+
+    lo = np.broadcast_to(lo, y.shape)
+    result = np.full(y.shape, never, dtype=np.int64)
+    pending = lo <= hi
+    if not pending.any():
+        return result
+    at_lo = pending & beyond(lo)
+    result[at_lo] = lo[at_lo]
+    pending &= ~at_lo
+    b = velocity + gravity / 2
+    disc = b * b - 2 * gravity * (y - level)
+    pending &= disc >= 0
+    root = np.sqrt(np.maximum(disc, 0))
+    if below:
+        pending &= lo < -b / gravity
+        roots = (-b - root) / gravity
+    else:
+        roots = (-b + root) / gravity
+    s = np.maximum(lo + 1, np.floor(roots).astype(np.int64) + 1)
+    for _ in range(2):
+        back = s - 1
+        step_back = pending & (back > lo) & beyond(back)
+        s[step_back] = back[step_back]
+    for _ in range(3):
+        found = pending & (s <= hi) & beyond(s)
+        result[found] = s[found]
+        pending &= ~found
+        s += 1
+    return result
+
+
+class FlappyPopulation:
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.frame = 0
+        self.pipes = []
+        self.y = np.full(n, bird_start_y, dtype=np.float64)
+        self.velocity = np.zeros(n, dtype=np.float64)
+        self.alive = np.ones(n, dtype=bool)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.death_frame = np.zeros(n, dtype=np.int64)
+        # Indices of the birds still flying; only they are stepped
+        self.active = np.arange(n)
+
+    def step(self, flaps=None, frames=1):
+        # flaps: a bool per bird (None = nobody flaps), applied on the first
+        # of the frames. Returns the indices of the birds that died.
+        if flaps is not None:
+            flapped = self.active[flaps[self.active]]
+            self.velocity[flapped] = flap_strength
+        dead = []
+        end = self.frame + frames
+        while self.frame < end:
+            if (self.frame + 1) % pipe_interval == 0:
+                self.pipes.append([screen_width, self.rng.randint(*gap_range)])
+            count = min(end - self.frame, pipe_interval - (self.frame + 1) % pipe_interval)
+            dead.append(self.advance(count))
+        return np.concatenate(dead)
+
+    def advance(self, count):
+        # FlappySim.advance for every active bird. Birds stopped by the top of
+        # the screen go round again from there with the frames they have left.
+        if count == 1:
+            return self._advance_frame()
+        pipes = self.pipes
+        idx = self.active
+        y = self.y[idx]
+        velocity = self.velocity[idx]
+        offset = np.zeros(len(idx), dtype=np.int64)
+        length = np.full(len(idx), count, dtype=np.int64)
+        died = [idx[:0]]
+        while len(idx):
+            ceiling = _first(y, velocity, 0, 1, length, True, True)
+            span = np.minimum(ceiling, length)
+            death = _first(y, velocity, ground_y - bird_height, 1, span, False, True)
+            for x, gap_y in pipes:
+                x = x - pipe_speed * offset
+                lo = np.maximum(1, (x - bird_x - bird_width) // pipe_speed + 1)
+                hi = np.minimum(np.minimum(death, span), -((bird_x - x - pipe_width) // pipe_speed) - 1)
+                death = np.minimum(death, _first(y, velocity, gap_y - pipe_gap // 2, lo, hi, True, False))
+                death = np.minimum(death, _first(y, velocity, gap_y + pipe_gap // 2 - bird_height,
+                                                 lo, hi, False, False))
+            dying = death < never
+            stop = np.minimum(death, span)
+            last = offset + stop - dying
+            for x, _ in pipes:
+                ahead = x + pipe_width // 2 - (bird_x + bird_width // 2)
+                if ahead > 0:
+                    crossing = -(-ahead // pipe_speed)
+                    self.score[idx[(offset < crossing) & (crossing <= last)]] += 1
+            at_ceiling = stop == ceiling
+            y = np.where(at_ceiling, 0.0, _heights(y, velocity, stop))
+            velocity = np.where(at_ceiling, 0.0, velocity + gravity * stop)
+            self.y[idx] = y
+            self.velocity[idx] = velocity
+            if dying.any():
+                self.alive[idx[dying]] = False
+                self.death_frame[idx[dying]] = self.frame + offset[dying] + stop[dying]
+                died.append(idx[dying])
+            more = ~dying & (stop < length)
+            idx, y, velocity = idx[more], y[more], velocity[more]
+            offset = offset[more] + stop[more]
+            length = length[more] - stop[more]
+        self.frame += count
+        for pipe in pipes:
+            pipe[0] -= pipe_speed * count
+        while pipes and pipes[0][0] + pipe_width < 0:
+            del pipes[0]
+        dead = np.concatenate(died)
+        if len(dead):
+            self.active = self.active[self.alive[self.active]]
+        return dead
+
+    def _advance_frame(self):
+        # advance(1) as plain per-frame sums, like FlappySim._advance_frame
+        self.frame += 1
+        pipes = self.pipes
+        for pipe in pipes:
+            pipe[0] -= pipe_speed
+        if pipes and pipes[0][0] + pipe_width < 0:
+            del pipes[0]
+        active = self.active
+        y = self.y[active]
+        velocity = self.velocity[active] + gravity
+        y += velocity
+        top = y <= 0
+        y[top] = 0
+        velocity[top] = 0
+        self.y[active] = y
+        self.velocity[active] = velocity
+        hit = y >= ground_y - bird_height
+        for x, gap_y in pipes:
+            if x < bird_x + bird_width and bird_x < x + pipe_width:
+                hit |= y < gap_y - pipe_gap // 2
+                hit |= y > gap_y + pipe_gap // 2 - bird_height
+        dead = active[hit]
+        if len(dead):
+            self.alive[dead] = False
+            self.death_frame[dead] = self.frame
+            self.active = active = active[~hit]
+        for x, _ in pipes:
+            if x + pipe_width // 2 == bird_x + bird_width // 2:
+                self.score[active] += 1
+        return dead
+
+    def next_pipe(self):
+        # The first pipe the birds have not yet cleared, or None
+        for pipe in self.pipes:
+            if pipe[0] + pipe_width > bird_x:
+                return pipe
+        return None
+
+    def run(self, policy, max_frames, frames=1):
+        # Plays step(policy(self), frames) until every bird is dead or
+        # max_frames have passed; returns the scores
+        end = self.frame + max_frames
+        while len(self.active) and self.frame < end:
+            self.step(policy(self), min(frames, end - self.frame))
+        return self.score
+
+
+class LinearPolicy:
+    # One weight vector per bird over (height above the next gap's center,
+    # velocity, distance to the next pipe, 1); a bird flaps when its sum is
+    # positive. The sort of population neuroevolution starts from.
+    def __init__(self, weights):
+        self.weights = weights
+
+    def __call__(self, population):
+        pipe = population.next_pipe()
+        dx, gap_y = (pipe[0] - bird_x, pipe[1]) if pipe else (screen_width, ground_y // 2)
+        active = population.active
+        w = self.weights[active]
+        flaps = np.zeros(population.n, dtype=bool)
+        flaps[active] = (w[:, 0] * (gap_y - population.y[active]) + w[:, 1] * population.velocity[active]
+                         + w[:, 2] * dx + w[:, 3]) > 0
+        return flaps
+
+
+if __name__ == '__main__':
+    # python flappy_batch.py [birds] [frames] [seed]
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    weights = np.random.default_rng(seed).normal(size=(n, 4)) * (-0.1, -1, 0.01, 1)
+    population = FlappyPopulation(n, seed)
+    start = time.perf_counter()
+    scores = population.run(LinearPolicy(weights), frames)
+    elapsed = time.perf_counter() - start
+    bird_frames = int(np.minimum(np.where(population.alive, population.frame, population.death_frame),
+                                 frames).sum())
+    print(f'{n} birds, {population.frame} frames in {elapsed:.2f}s: '
+          f'{bird_frames / elapsed:,.0f} bird-frames/s')
+    print(f'best score {scores.max()}, {population.alive.sum()} still flying')
+
+    # The same birds one at a time through FlappySim, for comparison
+    sample = min(n, 200)
+    start = time.perf_counter()
+    played = mismatches = 0
+    for i in range(sample):
+        sim = FlappySim(seed)
+        w = weights[i]
+
+        def policy(sim):
+            pipe = sim.next_pipe()
+            dx, gap_y = (pipe[0] - bird_x, pipe[1]) if pipe else (screen_width, ground_y // 2)
+            return w[0] * (gap_y - sim.y) + w[1] * sim.velocity + w[2] * dx + w[3] > 0
+
+        mismatches += sim.run(policy, frames) != scores[i]
+        played += sim.frame
+    elapsed = time.perf_counter() - start
+    print(f'FlappySim, {sample} birds: {played / elapsed:,.0f} bird-frames/s, '
+          f'{mismatches} scores differ')
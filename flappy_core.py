@@ -0,0 +1,235 @@
+# Flappy game rules shared by the pygame frontend and headless tools (no pygame here)
+import math
+import random
+import sys
+import time
+
+# Screen layout
+screen_width = 400
+screen_height = 600
+ground_y = screen_height - 100   # top of the base strip
+
+# The bird's left edge never moves; it starts centered on the screen
+bird_width = 34
+bird_height = 24
+bird_x = 50 - bird_width // 2
+bird_start_y = screen_height // 2 - bird_height // 2
+
+# Physics, per frame at fps frames per second
+fps = 120
+gravity = 0.25
+flap_strength = -6
+pipe_gap = 150
+pipe_width = 52
+pipe_speed = 2
+pipe_interval = 180   # frames between pipes, 1.5 s
+gap_range = (100, screen_height - 200)   # limits of the gap's center
+
+# Between inputs the bird's top edge s frames on is y + v*s + gravity*s*(s+1)/2,
+# so a run of frames is solved in one go: the frame the path first meets a
+# limit comes from the roots of that quadratic, then is checked exactly.
+# Heights and velocities are multiples of 1/4, so floats hold them exactly
+# and stepping 1 frame at a time or 50 gives the same game.
+
+
+def height(y, velocity, s):
+    # Top edge s frames on, with no input and nothing in the way
+    return y + velocity * s + gravity * (s * (s + 1) // 2)
+
+
+def _roots(y, velocity, level):
+    # Offsets where the path crosses level, or None if it never does
+    a = gravity / 2
+    b = velocity + gravity / 2
+    disc = b * b - 4 * a * (y - level)
+    if disc < 0:
+        return None
+    root = math.sqrt(disc)
+    return (-b - root) / (2 * a), (-b + root) / (2 * a)
+
+
+def _first(y, velocity, level, lo, hi, below, inclusive):
+    # First frame s in lo..hi where the top edge is below (else above)
+    # level, or equal to it when inclusive; None if there is none. The path
+    # is convex: it is below level only between the two roots.
+    def beyond(s):
+        h = height(y, velocity, s)
+        if below:
+            return h <= level if inclusive else h < level
+        return h >= level if inclusive else h > level
+
+    if lo > hi:
+        return None
+    if beyond(lo):
+        return lo
+    if lo == hi:
+        return None
+    roots = _roots(y, velocity, level)
+    if roots is None:
+        return None
+    if below:
+        if lo >= -(velocity + gravity / 2) / gravity:
+            return None   # past the top of the arc and above level
+        s = max(lo + 1, math.floor(roots[0]) + 1)
+    else:
+        s = max(lo + 1, math.floor(roots[1]) + 1)
+    # The roots are only approximate; settle on the exact first frame
+    while s - 1 > lo and beyond(s - 1):
+        s -= 1
+    for s in range(s, min(s + 3, hi + 1)):
+        if beyond(s):
+            return s
+    return None
+
+
+class FlappySim:
+    # Deterministic, display-free game. Time only advances through step(),
+    # which takes one input and plays any number of frames, returning
+    # ('spawn', pipe), ('score', score) and ('dead', score) events. Pipes are
+    # [x, gap_y] lists (left edge, center of the gap), oldest first.
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.frame = 0
+        self.y = float(bird_start_y)   # top edge
+        self.velocity = 0.0
+        self.pipes = []
+        self.score = 0
+        self.dead = False
+
+    def step(self, flap=False, frames=1):
+        # The input applies to the first of the frames
+        if self.dead:
+            return []
+        events = []
+        if flap:
+            self.velocity = flap_strength
+        end = self.frame + frames
+        while self.frame < end and not self.dead:
+            if (self.frame + 1) % pipe_interval == 0:
+                pipe = [screen_width, self.rng.randint(*gap_range)]
+                self.pipes.append(pipe)
+                events.append(('spawn', pipe))
+            # Up to the frame before the next pipe spawns
+            count = min(end - self.frame, pipe_interval - (self.frame + 1) % pipe_interval)
+            events.extend(self.advance(count))
+        return events
+
+    def advance(self, count):
+        # Plays count frames with no input, stopping early when the bird
+        # dies or reaches the top of the screen. No pipe may spawn in them.
+        if count == 1:
+            return self._advance_frame()
+        y, velocity, pipes = self.y, self.velocity, self.pipes
+        # The bird can't leave the top of the screen: it stops there
+        ceiling = _first(y, velocity, 0, 1, count, True, True)
+        span = ceiling or count
+        death = _first(y, velocity, ground_y - bird_height, 1, span, False, True)
+        for x, gap_y in pipes:
+            # Frames the pipe overlaps the bird's columns
+            lo = max(1, (x - bird_x - bird_width) // pipe_speed + 1)
+            hi = min(death or span, -((bird_x - x - pipe_width) // pipe_speed) - 1)
+            if lo > hi:
+                continue
+            for s in (_first(y, velocity, gap_y - pipe_gap // 2, lo, hi, True, False),
+                      _first(y, velocity, gap_y + pipe_gap // 2 - bird_height, lo, hi, False, False)):
+                if s is not None and (death is None or s < death):
+                    death = s
+        stop = death or span
+        events = []
+        # A point for each pipe whose center reaches the bird's, unless the
+        # bird dies on that frame
+        for x, _ in pipes:
+            ahead = x + pipe_width // 2 - (bird_x + bird_width // 2)
+            if ahead > 0 and -(-ahead // pipe_speed) <= (stop - 1 if death else stop):
+                self.score += 1
+                events.append(('score', self.score))
+        self.frame += stop
+        if stop == ceiling:
+            self.y = 0.0
+            self.velocity = 0.0
+        else:
+            self.y = height(y, velocity, stop)
+            self.velocity = velocity + gravity * stop
+        for pipe in pipes:
+            pipe[0] -= pipe_speed * stop
+        while pipes and pipes[0][0] + pipe_width < 0:
+            del pipes[0]
+        if death:
+            self.dead = True
+            events.append(('dead', self.score))
+        return events
+
+    def _advance_frame(self):
+        # advance(1) without solving anything: the same sums, frame by frame
+        pipes = self.pipes
+        self.frame += 1
+        self.velocity += gravity
+        self.y += self.velocity
+        if self.y <= 0:
+            self.y = 0.0
+            self.velocity = 0.0
+        for pipe in pipes:
+            pipe[0] -= pipe_speed
+        if pipes and pipes[0][0] + pipe_width < 0:
+            del pipes[0]
+        top = self.y
+        dead = top + bird_height >= ground_y
+        for x, gap_y in pipes:
+            if x < bird_x + bird_width and bird_x < x + pipe_width:
+                if top < gap_y - pipe_gap // 2 or top + bird_height > gap_y + pipe_gap // 2:
+                    dead = True
+        if dead:
+            self.dead = True
+            return [('dead', self.score)]
+        events = []
+        for x, _ in pipes:
+            if x + pipe_width // 2 == bird_x + bird_width // 2:
+                self.score += 1
+                events.append(('score', self.score))
+        return events
+
+    def next_pipe(self):
+        # The first pipe the bird has not yet cleared, or None
+        for pipe in self.pipes:
+            if pipe[0] + pipe_width > bird_x:
+                return pipe
+        return None
+
+    def run(self, policy, max_frames, frames=1):
+        # Plays step(policy(self), frames) until the bird dies or max_frames
+        # have passed; returns the score
+        end = self.frame + max_frames
+        while not self.dead and self.frame < end:
+            self.step(policy(self), min(frames, end - self.frame))
+        return self.score
+
+
+def gap_policy(sim):
+    # Flaps whenever the bird falls below the middle of the next gap
+    pipe = sim.next_pipe()
+    target = pipe[1] if pipe else ground_y // 2
+    return sim.velocity >= 0 and sim.y + bird_height > target + pipe_gap // 4
+
+
+if __name__ == '__main__':
+    # python flappy_core.py [frames] [seed]
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sim = FlappySim(seed)
+    played = 0
+    deaths = 0
+    best = 0
+    start = time.perf_counter()
+    while played < frames:
+        before = sim.frame
+        score = sim.run(gap_policy, frames - played)
+        played += sim.frame - before
+        best = max(best, score)
+        if sim.dead:
+            deaths += 1
+            sim = FlappySim(seed + deaths)
+    elapsed = time.perf_counter() - start
+    print(f'{played} frames in {elapsed:.2f}s: {played / elapsed:,.0f} frames/s, '
+          f'{played / elapsed / fps:,.0f}x real time')
+    print(f'{deaths} deaths, best score {best}')
@@ -0,0 +1,173 @@
+import os
+import struct
+import sys
+
+import numpy as np
+
+from flappy_batch import FlappyPopulation
+from flappy_core import FlappySim
+
+# Recorded Flappy runs for ghost playback: the pipe seed and the frames the
+# bird flapped on, as varint gaps from the previous flap. FlappySim is
+# deterministic, so that rebuilds every frame of the run in a few hundred
+# bytes. Ghosts plays any number of runs of one seed together through a
+# FlappyPopulation.
+
+magic = b'FRUN'
+version = 2   # 2: float kinematics; older runs no longer replay
+_header = struct.Struct('<4sBIII')   # magic, version, seed, score, frames
+extension = '.frun'
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Run:
+    def __init__(self, seed, flaps=(), frames=0, score=0):
+        self.seed = seed
+        self.flaps = list(flaps)   # frame numbers, ascending
+        self.frames = frames       # frame the run ended on
+        self.score = score
+
+    def to_bytes(self):
+        out = bytearray(_header.pack(magic, version, self.seed, self.score, self.frames))
+        write_varint(out, len(self.flaps))
+        previous = 0
+        for frame in self.flaps:
+            write_varint(out, frame - previous)
+            previous = frame
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        tag, file_version, seed, score, frames = _header.unpack_from(data)
+        if tag != magic or file_version != version:
+            raise ValueError('not a Flappy run')
+        count, pos = read_varint(data, _header.size)
+        flaps = []
+        frame = 0
+        for _ in range(count):
+            gap, pos = read_varint(data, pos)
+            frame += gap
+            flaps.append(frame)
+        return cls(seed, flaps, frames, score)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    # Wraps a FlappySim; route inputs through step() and call finish() at the end
+    def __init__(self, sim):
+        if not isinstance(sim.seed, int):
+            raise ValueError('recording needs a simulation with an integer seed')
+        self.sim = sim
+        self.run = Run(sim.seed)
+
+    def step(self, flap=False):
+        if flap and not self.sim.dead:
+            self.run.flaps.append(self.sim.frame + 1)
+        return self.sim.step(flap)
+
+    def finish(self):
+        self.run.frames = self.sim.frame
+        self.run.score = self.sim.score
+        return self.run
+
+
+def verify(run):
+    # True when replaying the flaps reproduces the recorded score. The sim
+    # coasts from one flap straight to the next.
+    sim = FlappySim(run.seed)
+    for frame in run.flaps:
+        if frame - 1 > sim.frame:
+            sim.step(False, frame - 1 - sim.frame)
+        sim.step(True)
+    if run.frames > sim.frame:
+        sim.step(False, run.frames - sim.frame)
+    return sim.score == run.score and sim.frame == run.frames
+
+
+def load_runs(directory):
+    if not os.path.isdir(directory):
+        return []
+    runs = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(extension):
+            try:
+                runs.append(Run.load(os.path.join(directory, name)))
+            except (ValueError, struct.error):
+                continue
+    return runs
+
+
+def top_runs(directory, seed, k):
+    # The k best-scoring runs recorded on seed's pipes
+    runs = [run for run in load_runs(directory) if run.seed == seed]
+    runs.sort(key=lambda run: run.score, reverse=True)
+    return runs[:k]
+
+
+class Ghosts:
+    # Plays runs of one seed side by side. Every run's flaps are merged into
+    # one frame-ordered array, so a frame's flaps are a single slice of it.
+    def __init__(self, runs, seed):
+        self.population = FlappyPopulation(len(runs), seed)
+        frames = np.array([frame for run in runs for frame in run.flaps], dtype=np.int64)
+        owners = np.repeat(np.arange(len(runs)), [len(run.flaps) for run in runs])
+        order = np.argsort(frames, kind='stable')
+        self.flap_frames = frames[order]
+        self.flap_owners = owners[order]
+        self.next = 0
+        self.flaps = np.zeros(len(runs), dtype=bool)
+
+    def step(self):
+        population = self.population
+        end = self.next + int(np.searchsorted(self.flap_frames[self.next:], population.frame + 1, 'right'))
+        owners = self.flap_owners[self.next:end]
+        self.next = end
+        self.flaps[owners] = True
+        population.step(self.flaps)
+        self.flaps[owners] = False
+
+    def heights(self):
+        # Top edges of the ghosts still flying
+        population = self.population
+        return population.y[population.active]
+
+
+if __name__ == '__main__':
+    # python flappy_ghosts.py [runs directory]: checks every recorded run
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'ghosts'
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(extension):
+            path = os.path.join(directory, name)
+            try:
+                run = Run.load(path)
+            except (ValueError, struct.error):
+                print(f'{name}: not a version {version} Flappy run')
+                continue
+            status = 'ok' if verify(run) else 'MISMATCH'
+            print(f'{name}: seed {run.seed}, score {run.score}, {run.frames} frames, '
+                  f'{len(run.flaps)} flaps in {os.path.getsize(path)} bytes, {status}')
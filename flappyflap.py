@@ -1,6 +1,12 @@
 import pygame
-import sys
+import os
 import random
+import sys
+import time
+
+from flappy_core import (FlappySim, bird_x, bird_width, bird_height, bird_start_y, fps, ground_y,
+                         pipe_gap, pipe_width, pipe_speed, pipe_interval)
+from flappy_ghosts import Ghosts, Recorder, top_runs, extension
 
 # Initialize Pygame
 pygame.init()
@@ -13,125 +19,202 @@ SCREEN_HEIGHT = 600
 SCREEN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption('Flappy Bird')
 
-# Define constants
-GRAVITY = 0.25
-BIRD_FLAP_STRENGTH = -6
-PIPE_GAP = 150
-PIPE_FREQUENCY = 1500  # milliseconds
+# Physics, pipe spawning, collisions and scoring live in flappy_core; the
+# sprites here only show the simulation's state
 
 # Load images
-BIRD_IMG = pygame.Surface((34, 24), pygame.SRCALPHA)
+BIRD_IMG = pygame.Surface((bird_width, bird_height), pygame.SRCALPHA)
 pygame.draw.polygon(BIRD_IMG, (255, 255, 0), [(0, 12), (17, 0), (34, 12), (17, 24)])
-PIPE_IMG = pygame.Surface((52, SCREEN_HEIGHT), pygame.SRCALPHA)
+# Every ghost is drawn from this one see-through copy of the bird
+GHOST_IMG = BIRD_IMG.copy()
+GHOST_IMG.fill((255, 255, 255, 80), special_flags=pygame.BLEND_RGBA_MULT)
+PIPE_IMG = pygame.Surface((pipe_width, SCREEN_HEIGHT), pygame.SRCALPHA)
 PIPE_IMG.fill((0, 255, 0))
-BASE_IMG = pygame.Surface((SCREEN_WIDTH, 100))
+PIPE_TOP_IMG = pygame.transform.flip(PIPE_IMG, False, True)
+BASE_IMG = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT - ground_y))
 BASE_IMG.fill((222, 216, 149))
 BACKGROUND_COLOR = (135, 206, 235)
 
 # Define fonts
 FONT = pygame.font.SysFont('Arial', 32, bold=True)
 
+# Game states; main() moves between them without ever calling itself
+MENU, PLAY, GAME_OVER = 'menu', 'play', 'game over'
+GAME_OVER_MS = 2000  # how long the game over screen stays up
+
+# Runs that scored are saved here as ghosts for later games on the same seed
+GHOSTS_DIR = 'ghosts'
+
+# Most pipe pairs that can be on screen at once
+PIPE_POOL_SIZE = (SCREEN_WIDTH + pipe_width) // (pipe_speed * pipe_interval) + 1
+
 class Bird(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, sim=None):
         super().__init__()
+        self.sim = sim
         self.image = BIRD_IMG
-        self.rect = self.image.get_rect(center=(50, SCREEN_HEIGHT // 2))
-        self.velocity = 0
+        self.rect = self.image.get_rect(topleft=(bird_x, bird_start_y))
 
     def update(self):
-        self.velocity += GRAVITY
-        self.rect.y += int(self.velocity)
-
-        # Prevent bird from going off-screen
-        if self.rect.top <= 0:
-            self.rect.top = 0
-            self.velocity = 0
-
-    def flap(self):
-        self.velocity = BIRD_FLAP_STRENGTH
+        self.rect.y = self.sim.y
 
 class Pipe(pygame.sprite.Sprite):
-    def __init__(self, inverted, x, y):
+    # One half of a simulated pipe, a [x, gap_y] list owned by the simulation.
+    # Sprites come from a PipePool and go back to it off screen.
+    def __init__(self, inverted, pool):
         super().__init__()
-        self.image = PIPE_IMG
+        self.inverted = inverted
+        self.pool = pool
+        self.image = PIPE_TOP_IMG if inverted else PIPE_IMG
         self.rect = self.image.get_rect()
-        if inverted:
-            self.image = pygame.transform.flip(self.image, False, True)
-            self.rect.bottomleft = (x, y - PIPE_GAP // 2)
+        self.pipe = None
+
+    def reset(self, pipe):
+        self.pipe = pipe
+        x, y = pipe
+        if self.inverted:
+            self.rect.bottomleft = (x, y - pipe_gap // 2)
         else:
-            self.rect.topleft = (x, y + PIPE_GAP // 2)
+            self.rect.topleft = (x, y + pipe_gap // 2)
 
     def update(self):
-        self.rect.x -= 2
+        self.rect.x = self.pipe[0]
         if self.rect.right < 0:
-            self.kill()
-
-def check_collision(bird, pipes):
-    return pygame.sprite.spritecollideany(bird, pipes)
+            self.pool.release(self)
+
+class PipePool:
+    # Pipe sprites made once and recycled; group holds the ones in use
+    def __init__(self, size=PIPE_POOL_SIZE):
+        self.group = pygame.sprite.Group()
+        self.free = {inverted: [Pipe(inverted, self) for _ in range(size)] for inverted in (True, False)}
+
+    def spawn(self, pipe):
+        for inverted in (True, False):
+            free = self.free[inverted]
+            # Only if size was too small for the screen
+            sprite = free.pop() if free else Pipe(inverted, self)
+            sprite.reset(pipe)
+            self.group.add(sprite)
+
+    def release(self, sprite):
+        self.group.remove(sprite)
+        self.free[sprite.inverted].append(sprite)
+
+    def clear(self):
+        for sprite in self.group.sprites():
+            self.release(sprite)
 
 def display_score(screen, score):
     score_surface = FONT.render(f'Score: {score}', True, (255, 255, 255))
     screen.blit(score_surface, (10, 10))
 
+def menu_screen(screen, bird_group):
+    screen.fill(BACKGROUND_COLOR)
+    bird_group.draw(screen)
+    screen.blit(BASE_IMG, (0, ground_y))
+    title_surface = FONT.render('Press space to fly', True, (255, 255, 255))
+    screen.blit(title_surface, (SCREEN_WIDTH // 2 - title_surface.get_width() // 2, SCREEN_HEIGHT // 2 - 100))
+
 def game_over_screen(screen, score):
     screen.fill(BACKGROUND_COLOR)
     game_over_surface = FONT.render('Game Over!', True, (255, 0, 0))
     score_surface = FONT.render(f'Final Score: {score}', True, (255, 255, 255))
     screen.blit(game_over_surface, (SCREEN_WIDTH // 2 - game_over_surface.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
     screen.blit(score_surface, (SCREEN_WIDTH // 2 - score_surface.get_width() // 2, SCREEN_HEIGHT // 2))
-    pygame.display.flip()
-    pygame.time.wait(2000)
 
-def main():
+def save_run(run):
+    os.makedirs(GHOSTS_DIR, exist_ok=True)
+    path = os.path.join(GHOSTS_DIR, f"{run.seed}-{time.strftime('%Y%m%d-%H%M%S')}-{run.score}{extension}")
+    run.save(path)
+    return path
+
+def main(seed=None, ghosts=0):
+    # The clock, sprites and pipe pool live across games; only the
+    # simulation is new for each one. Games are seeded seed, seed + 1, ...
+    # (random without a seed). With ghosts, every game is on seed's pipes
+    # (0 without one) against its best ghosts recorded runs.
     clock = pygame.time.Clock()
     bird = Bird()
     bird_group = pygame.sprite.GroupSingle(bird)
-    pipe_group = pygame.sprite.Group()
-
-    SPWANPIPE = pygame.USEREVENT
-    pygame.time.set_timer(SPWANPIPE, PIPE_FREQUENCY)
-
-    score = 0
-    running = True
-    while running:
-        clock.tick(120)
+    pipes = PipePool()
+    sim = None
+    recorder = None
+    replays = None
+    games = 0
+    state = MENU
+    game_over_at = 0
+    menu_screen(SCREEN, bird_group)
+    pygame.display.update()
+
+    while True:
+        clock.tick(fps)
+        flap = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
-            if event.type == SPWANPIPE:
-                pipe_height = random.randint(100, SCREEN_HEIGHT - 200)
-                top_pipe = Pipe(True, SCREEN_WIDTH, pipe_height)
-                bottom_pipe = Pipe(False, SCREEN_WIDTH, pipe_height)
-                pipe_group.add(top_pipe)
-                pipe_group.add(bottom_pipe)
-
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
-                    bird.flap()
-
-        # Update
+                    flap = True
+
+        if state == MENU:
+            if flap:
+                # The key that starts the game is also its first flap
+                if ghosts:
+                    game_seed = seed or 0
+                    replays = Ghosts(top_runs(GHOSTS_DIR, game_seed, ghosts), game_seed)
+                elif seed is None:
+                    game_seed = random.randrange(1 << 32)
+                else:
+                    game_seed = seed + games
+                sim = FlappySim(game_seed)
+                recorder = Recorder(sim)
+                games += 1
+                bird.sim = sim
+                pipes.clear()
+                state = PLAY
+            else:
+                continue
+
+        if state == GAME_OVER:
+            if pygame.time.get_ticks() - game_over_at >= GAME_OVER_MS:
+                bird.rect.y = bird_start_y
+                menu_screen(SCREEN, bird_group)
+                pygame.display.update()
+                state = MENU
+            continue
+
+        # Update, one simulation frame per displayed frame
+        for kind, value in recorder.step(flap):
+            if kind == 'spawn':
+                pipes.spawn(value)
+        if replays is not None:
+            replays.step()
         bird_group.update()
-        pipe_group.update()
+        pipes.group.update()
 
         # Collision
-        if check_collision(bird, pipe_group) or bird.rect.bottom >= SCREEN_HEIGHT - 100:
-            game_over_screen(SCREEN, score)
-            main()
-
-        # Scoring
-        for pipe in pipe_group:
-            if pipe.rect.centerx == bird.rect.centerx and pipe.rect.bottom >= SCREEN_HEIGHT:
-                score += 0.5  # Increment score when passing each bottom pipe
+        if sim.dead:
+            run = recorder.finish()
+            if run.score > 0:
+                save_run(run)
+            game_over_screen(SCREEN, sim.score)
+            pygame.display.update()
+            game_over_at = pygame.time.get_ticks()
+            state = GAME_OVER
+            continue
 
         # Draw
         SCREEN.fill(BACKGROUND_COLOR)
+        if replays is not None:
+            SCREEN.blits([(GHOST_IMG, (bird_x, y)) for y in replays.heights().tolist()], False)
         bird_group.draw(SCREEN)
-        pipe_group.draw(SCREEN)
-        SCREEN.blit(BASE_IMG, (0, SCREEN_HEIGHT - 100))
-        display_score(SCREEN, int(score))
+        pipes.group.draw(SCREEN)
+        SCREEN.blit(BASE_IMG, (0, ground_y))
+        display_score(SCREEN, sim.score)
         pygame.display.update()
 
 if __name__ == '__main__':
-    main()
+    # python flappyflap.py [ghosts [seed]]
+    main(int(sys.argv[2]) if len(sys.argv) > 2 else None, int(sys.argv[1]) if len(sys.argv) > 1 else 0)
@@ -1,5 +1,14 @@
 import pygame
+import os
+import random
 import sys
+from math import isqrt
+
+from sudoku_generator import make_puzzle
+from sudoku_hints import HintEngine
+from sudoku_library import Library, difficulties
+from sudoku_rules import AllDifferent, classic
+from sudoku_solver import symbols
 
 # Initialize Pygame
 pygame.init()
@@ -13,6 +22,7 @@ pygame.display.set_caption('Sudoku')
 # Fonts
 FONT = pygame.font.SysFont('Arial', 40)
 SMALL_FONT = pygame.font.SysFont('Arial', 20)
+HINT_FONT = pygame.font.SysFont('Arial', 16)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -20,6 +30,50 @@ LIGHT_BLUE = (173, 216, 230)
 BLACK = (0, 0, 0)
 GRAY = (128, 128, 128)
 RED = (255, 0, 0)
+GREEN = (0, 160, 0)
+ORANGE = (255, 165, 0)
+
+# Fires once a second to update the clock; nothing else wakes the game up
+CLOCK_TICK = pygame.USEREVENT
+# Posted by the hint engine's worker thread when an analysis is ready
+HINT_READY = pygame.USEREVENT + 1
+STATUS_RECT = pygame.Rect(0, HEIGHT - 40, WIDTH, 40)
+
+# Keys typed for each digit; letters stand for digits above 9
+KEY_DIGITS = {symbol: digit for digit, symbol in enumerate(symbols, 1)}
+
+def build_digit_atlas(font, colors, size=9):
+    # Renders digits 1 to size in each color once into a single surface;
+    # returns it with a dict mapping (color, digit) to the glyph's area in it
+    glyphs = {(color, digit): font.render(symbols[digit - 1], True, color)
+              for color in colors for digit in range(1, size + 1)}
+    width = max(glyph.get_width() for glyph in glyphs.values())
+    height = max(glyph.get_height() for glyph in glyphs.values())
+    atlas = pygame.Surface((width * size, height * len(colors)), pygame.SRCALPHA)
+    areas = {}
+    for (color, digit), glyph in glyphs.items():
+        pos = ((digit - 1) * width, colors.index(color) * height)
+        # MAX onto the transparent atlas copies the glyph's pixels unblended
+        atlas.blit(glyph, pos, special_flags=pygame.BLEND_RGBA_MAX)
+        areas[color, digit] = pygame.Rect(pos, glyph.get_size())
+    return atlas.convert_alpha(), areas
+
+ATLASES = {}
+
+def digit_atlas(size, small=False):
+    # Glyphs scaled to the cells of a size x size grid, or to the pencil-mark
+    # slots within them when small, built on first use
+    if (size, small) not in ATLASES:
+        if small:
+            font = pygame.font.SysFont('Arial', max(8, WIDTH // size // isqrt(size) * 2 // 3))
+            ATLASES[size, small] = build_digit_atlas(font, [GRAY], size)
+        else:
+            font = FONT if size == 9 else pygame.font.SysFont('Arial', WIDTH // size * 2 // 3)
+            ATLASES[size, small] = build_digit_atlas(font, [BLACK, GRAY, RED], size)
+    return ATLASES[size, small]
+
+# Puzzle library built with sudoku_library.py; without it every game uses BOARD
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sudoku_puzzles.sdk')
 
 # Sample Sudoku Board (0 represents empty cell)
 BOARD = [
@@ -35,40 +89,119 @@ BOARD = [
 ]
 
 class Grid:
-    def __init__(self, rows, cols, width, height, board):
+    def __init__(self, rows, cols, width, height, board, rules=()):
         self.rows = rows
         self.cols = cols
-        self.cells = [[Cell(board[i][j], i, j, width, height) for j in range(cols)] for i in range(rows)]
+        self.box = isqrt(rows)
+        self.cells = [[Cell(0, i, j, width, height, rows) for j in range(cols)] for i in range(rows)]
         self.selected = None
+        # Cells to redraw on the next draw_dirty call
+        self.dirty = set()
+        # Units are the rows, columns and boxes, then the regions of any
+        # extra rules (sudoku_rules) that need different digits, like
+        # diagonals and cages. Per unit: a mask of placed digits, a count of
+        # each placed digit, and a count of each digit on show (placed or
+        # pencilled in) for conflict highlighting.
+        n = rows
+        self.rules = list(rules)
+        regions = classic(self.box) + [rule for rule in self.rules if isinstance(rule, AllDifferent)]
+        self.unit_cells = [[divmod(i, cols) for i in rule.cells] for rule in regions]
+        self.units = [[[] for j in range(cols)] for i in range(rows)]
+        for unit, cells in enumerate(self.unit_cells):
+            for i, j in cells:
+                self.units[i][j].append(unit)
+        self.masks = [0] * len(regions)
+        self.counts = [[0] * (n + 1) for _ in regions]
+        self.shown = [[0] * (n + 1) for _ in regions]
+        # Rules asking more than different digits (cage sums, thermometers),
+        # checked against the placed digits whenever a cell they watch is filled
+        self.checks = [[[] for j in range(cols)] for i in range(rows)]
+        for rule in self.rules:
+            if type(rule) is not AllDifferent:
+                for i in rule.cells:
+                    self.checks[i // cols][i % cols].append(rule)
+        self.filled = 0
+        # The hint on show and the pencil marks (a candidate mask per cell in
+        # row-major order), or None
+        self.hint = None
+        self.marks = None
+        for i in range(rows):
+            for j in range(cols):
+                if board[i][j] != 0:
+                    self.set_value(i, j, board[i][j])
 
     def draw(self, win):
-        # Draw grid lines
-        gap = WIDTH // 9
+        self.draw_lines(win)
+
+        # Draw cells
+        for row in self.cells:
+            for cell in row:
+                self.draw_cell(win, cell.row, cell.col)
+        self.dirty.clear()
+
+    def draw_cell(self, win, row, col):
+        cell = self.cells[row][col]
+        cell.draw(win, self.conflicting(row, col))
+        gap = WIDTH // self.rows
+        x, y = col * gap, row * gap
+        if self.marks and cell.value == 0 and cell.temp == 0:
+            # Candidate d sits in slot d of a box x box layout, like a keypad
+            digits, areas = digit_atlas(self.rows, True)
+            slot = gap // self.box
+            mask = self.marks[row * self.cols + col]
+            for digit in range(1, self.rows + 1):
+                if mask >> (digit - 1) & 1:
+                    area = areas[GRAY, digit]
+                    sx = x + (digit - 1) % self.box * slot + (slot - area.width) // 2
+                    sy = y + (digit - 1) // self.box * slot + (slot - area.height) // 2
+                    win.blit(digits, (sx, sy), area)
+        if self.hint is not None:
+            if (row, col) == self.hint.cell:
+                pygame.draw.rect(win, GREEN, (x + 3, y + 3, gap - 5, gap - 5), 2)
+            elif (row, col) in self.hint.reasons:
+                pygame.draw.rect(win, ORANGE, (x + 3, y + 3, gap - 5, gap - 5), 2)
+
+    def draw_lines(self, win):
+        gap = WIDTH // self.rows
+        end = gap * self.rows + 1
         for i in range(self.rows + 1):
-            if i % 3 == 0 and i != 0:
+            if i % self.box == 0 and i != 0:
                 thickness = 4
             else:
                 thickness = 1
-            pygame.draw.line(win, BLACK, (0, i * gap), (WIDTH, i * gap), thickness)
-            pygame.draw.line(win, BLACK, (i * gap, 0), (i * gap, WIDTH), thickness)
+            pygame.draw.line(win, BLACK, (0, i * gap), (end, i * gap), thickness)
+            pygame.draw.line(win, BLACK, (i * gap, 0), (i * gap, end), thickness)
 
-        # Draw cells
-        for row in self.cells:
-            for cell in row:
-                cell.draw(win)
+    def draw_dirty(self, win):
+        # Redraws only the changed cells and returns their rects for display.update
+        gap = WIDTH // self.rows
+        rects = []
+        for row, col in self.dirty:
+            rect = pygame.Rect(col * gap, row * gap, gap, gap)
+            # Clipped to the cell, this paints exactly what a full redraw would there
+            win.set_clip(rect)
+            win.fill(WHITE)
+            self.draw_lines(win)
+            self.draw_cell(win, row, col)
+            rects.append(rect)
+        win.set_clip(None)
+        self.dirty.clear()
+        return rects
 
     def select(self, row, col):
-        # Reset all other cells
-        for r in self.cells:
-            for c in r:
-                c.selected = False
+        # Only the previously selected cell needs resetting
+        if self.selected:
+            r, c = self.selected
+            self.cells[r][c].selected = False
+            self.dirty.add(self.selected)
 
         self.cells[row][col].selected = True
         self.selected = (row, col)
+        self.dirty.add(self.selected)
 
     def click(self, pos):
-        if pos[0] < WIDTH and pos[1] < WIDTH:
-            gap = WIDTH // 9
+        gap = WIDTH // self.rows
+        if pos[0] < gap * self.cols and pos[1] < gap * self.rows:
             x = pos[0] // gap
             y = pos[1] // gap
             return (int(y), int(x))
@@ -78,58 +211,155 @@ class Grid:
     def place(self, val):
         row, col = self.selected
         if self.cells[row][col].value == 0:
-            self.cells[row][col].set_temp(val)
+            self.set_temp(row, col, val)
 
     def clear(self):
         row, col = self.selected
         if self.cells[row][col].value == 0:
-            self.cells[row][col].set_temp(0)
+            self.set_temp(row, col, 0)
 
-    def is_finished(self):
-        for row in self.cells:
-            for cell in row:
-                if cell.value == 0:
+    def _show(self, cell, delta):
+        digit = cell.value or cell.temp
+        if digit:
+            for unit in self.units[cell.row][cell.col]:
+                self.shown[unit][digit] += delta
+                # Going from one to two (or back) flips the conflict flag of
+                # every cell in the unit showing this digit
+                if self.shown[unit][digit] == (2 if delta > 0 else 1):
+                    for r, c in self.unit_cells[unit]:
+                        other = self.cells[r][c]
+                        if (other.value or other.temp) == digit:
+                            self.dirty.add((r, c))
+        self.dirty.add((cell.row, cell.col))
+
+    def set_temp(self, row, col, val):
+        cell = self.cells[row][col]
+        if cell.temp == val:
+            return
+        self._show(cell, -1)
+        cell.set_temp(val)
+        self._show(cell, 1)
+
+    def set_value(self, row, col, val):
+        # Places val (0 empties the cell), keeping the unit masks and counts current
+        cell = self.cells[row][col]
+        self._show(cell, -1)
+        units = self.units[row][col]
+        if cell.value != 0:
+            self.filled -= 1
+            for unit in units:
+                self.counts[unit][cell.value] -= 1
+                if self.counts[unit][cell.value] == 0:
+                    self.masks[unit] &= ~(1 << cell.value)
+        cell.value = val
+        cell.temp = 0
+        if val != 0:
+            self.filled += 1
+            for unit in units:
+                self.counts[unit][val] += 1
+                self.masks[unit] |= 1 << val
+        self._show(cell, 1)
+
+    def valid(self, row, col, num):
+        # True if num is not yet placed in a unit of an empty cell, and
+        # placing it leaves every other rule on the cell satisfiable
+        for unit in self.units[row][col]:
+            if self.masks[unit] & (1 << num):
+                return False
+        if self.checks[row][col]:
+            every = (1 << self.rows) - 1
+            domains = [1 << (cell.value - 1) if cell.value else every for line in self.cells for cell in line]
+            domains[row * self.cols + col] = 1 << (num - 1)
+            for rule in self.checks[row][col]:
+                if rule.propagate(domains[:]) is None:
                     return False
         return True
 
+    def conflicting(self, row, col):
+        # True if the digit on show in this cell is also on show elsewhere in one of its units
+        cell = self.cells[row][col]
+        digit = cell.value or cell.temp
+        if digit == 0:
+            return False
+        for unit in self.units[row][col]:
+            if self.shown[unit][digit] > 1:
+                return True
+        return False
+
+    def conflicts(self):
+        return [(i, j) for i in range(self.rows) for j in range(self.cols) if self.conflicting(i, j)]
+
+    def is_finished(self):
+        return self.filled == self.rows * self.cols
+
+    def snapshot(self):
+        # The placed digits as a tuple of rows, for the hint engine
+        return tuple(tuple(cell.value for cell in row) for row in self.cells)
+
+    def show_hint(self, hint):
+        for shown in (self.hint, hint):
+            if shown is not None and shown.cell is not None:
+                self.dirty.add(shown.cell)
+                self.dirty.update(shown.reasons)
+        self.hint = hint
+
+    def show_marks(self, marks):
+        if marks == self.marks:
+            return
+        for i in range(self.rows * self.cols):
+            if (self.marks[i] if self.marks else 0) != (marks[i] if marks else 0):
+                self.dirty.add(divmod(i, self.cols))
+        self.marks = marks
+
 class Cell:
-    def __init__(self, value, row, col, width, height):
+    def __init__(self, value, row, col, width, height, size=9):
         self.value = value
         self.temp = 0
         self.row = row
         self.col = col
         self.width = width
         self.height = height
+        self.size = size
         self.selected = False
 
     def set_temp(self, val):
         self.temp = val
 
-    def draw(self, win):
-        gap = self.width // 9
+    def draw(self, win, conflict=False):
+        gap = self.width // self.size
         x = self.col * gap
         y = self.row * gap
+        digits, areas = digit_atlas(self.size)
 
         if self.temp != 0 and self.value == 0:
-            text = FONT.render(str(self.temp), True, GRAY)
-            win.blit(text, (x + 5, y + 5))
+            area = areas[RED if conflict else GRAY, self.temp]
+            win.blit(digits, (x + gap // 12, y + gap // 12), area)
         elif self.value != 0:
-            text = FONT.render(str(self.value), True, BLACK)
-            win.blit(text, (x + (gap // 2 - text.get_width() // 2), y + (gap // 2 - text.get_height() // 2)))
+            area = areas[RED if conflict else BLACK, self.value]
+            win.blit(digits, (x + (gap // 2 - area.width // 2), y + (gap // 2 - area.height // 2)), area)
 
         if self.selected:
             pygame.draw.rect(win, LIGHT_BLUE, (x, y, gap, gap), 3)
 
-def redraw_window(win, board, time, strikes):
+def redraw_window(win, board, time, strikes, message=""):
     win.fill(WHITE)
+    draw_status(win, time, strikes, message)
+    # Draw grid and board
+    board.draw(win)
+
+def draw_status(win, time, strikes, message=""):
+    win.fill(WHITE, STATUS_RECT)
     # Draw time
     text = SMALL_FONT.render("Time: " + format_time(time), True, BLACK)
     win.blit(text, (WIDTH - 160, HEIGHT - 40))
     # Draw strikes
     text = SMALL_FONT.render("X " * strikes, True, RED)
     win.blit(text, (20, HEIGHT - 40))
-    # Draw grid and board
-    board.draw(win)
+    # Draw the hint
+    if message:
+        text = HINT_FONT.render(message, True, GREEN)
+        win.blit(text, (20, HEIGHT - 18))
+    return STATUS_RECT
 
 def format_time(secs):
     sec = secs % 60
@@ -137,48 +367,114 @@ def format_time(secs):
     time_format = " " + str(minute) + ":" + str(sec).zfill(2)
     return time_format
 
-def main():
-    board = Grid(9, 9, WIDTH, WIDTH, BOARD)
+def library_puzzle(difficulty=None):
+    # A random puzzle of the given difficulty (any if None) from the library
+    if not os.path.exists(LIBRARY_PATH):
+        return BOARD
+    if difficulty is not None and difficulty not in difficulties:
+        print("Unknown difficulty " + difficulty + ", expected one of " + ", ".join(difficulties))
+        return BOARD
+    with Library(LIBRARY_PATH) as library:
+        if len(library) == 0:
+            print("The puzzle library is empty")
+            return BOARD
+        if difficulty is not None and library.count(difficulty) == 0:
+            print("No " + difficulty + " puzzles in the library")
+            return BOARD
+        return library.random(difficulty)
+
+def show_analysis(board, engine, want_hint, want_marks):
+    # Shows what the hint engine has for the board, asking it for an analysis
+    # if it has none yet; returns the message for the status bar
+    if not want_hint and not want_marks:
+        board.show_hint(None)
+        board.show_marks(None)
+        return ""
+    analysis = engine.request(board.snapshot())
+    if analysis is None:
+        # Keep showing the old marks until the new ones arrive
+        board.show_hint(None)
+        return "Thinking..." if want_hint else ""
+    board.show_marks(analysis.marks if want_marks else None)
+    hint = analysis.hint
+    board.show_hint(hint if want_hint else None)
+    if not want_hint:
+        return ""
+    if hint is None:
+        return "Nothing left to place"
+    if hint.cell is None:
+        return "No solution from here; some placed digit is wrong"
+    row, col = hint.cell
+    return (hint.technique.capitalize() + ": " + symbols[hint.digit - 1]
+            + " at row " + str(row + 1) + ", column " + str(col + 1))
+
+def main(box=3, difficulty=None):
+    if box == 3:
+        board = Grid(9, 9, WIDTH, WIDTH, library_puzzle(difficulty))
+    else:
+        # Larger grids get a fresh puzzle with 55% of the cells given; much
+        # sparser 25x25 puzzles take too long to prove unique
+        n = box * box
+        puzzle, _ = make_puzzle(random.Random(), n * n * 11 // 20, box)
+        board = Grid(n, n, WIDTH, WIDTH, puzzle)
     key = None
     run = True
     strikes = 0
     start = pygame.time.get_ticks()
+    play_time = 0
+    # Space shows the next deduction, tab toggles pencil marks. The analysis
+    # runs on the engine's thread, so the game never waits for it.
+    engine = HintEngine(lambda: pygame.event.post(pygame.event.Event(HINT_READY)))
+    want_hint = want_marks = False
+    message = ""
+    pygame.time.set_timer(CLOCK_TICK, 1000)
+    redraw_window(WIN, board, play_time, strikes)
+    pygame.display.update()
     while run:
-        play_time = (pygame.time.get_ticks() - start) // 1000
-        for event in pygame.event.get():
+        # Sleep until something happens, then take whatever else has queued up
+        events = [pygame.event.wait()] + pygame.event.get()
+        status_changed = False
+        analysis_changed = False
+        for event in events:
             if event.type == pygame.QUIT:
+                engine.close()
                 pygame.quit()
                 sys.exit()
 
+            if event.type == HINT_READY:
+                analysis_changed = True
+
+            if event.type == CLOCK_TICK:
+                seconds = (pygame.time.get_ticks() - start) // 1000
+                if seconds != play_time:
+                    play_time = seconds
+                    status_changed = True
+
             if event.type == pygame.KEYDOWN:
-                if board.selected:
-                    if event.key == pygame.K_1:
-                        key = 1
-                    elif event.key == pygame.K_2:
-                        key = 2
-                    elif event.key == pygame.K_3:
-                        key = 3
-                    elif event.key == pygame.K_4:
-                        key = 4
-                    elif event.key == pygame.K_5:
-                        key = 5
-                    elif event.key == pygame.K_6:
-                        key = 6
-                    elif event.key == pygame.K_7:
-                        key = 7
-                    elif event.key == pygame.K_8:
-                        key = 8
-                    elif event.key == pygame.K_9:
-                        key = 9
+                if event.key == pygame.K_SPACE:
+                    want_hint = not want_hint
+                    analysis_changed = True
+                elif event.key == pygame.K_TAB:
+                    want_marks = not want_marks
+                    analysis_changed = True
+                elif board.selected:
+                    digit = KEY_DIGITS.get(event.unicode.upper(), 0)
+                    if 0 < digit <= board.rows:
+                        key = digit
                     elif event.key == pygame.K_BACKSPACE:
                         board.clear()
                         key = None
                     elif event.key == pygame.K_RETURN:
                         row, col = board.selected
-                        if board.cells[row][col].temp != 0:
-                            if valid(BOARD, board.cells[row][col].temp, (row, col)):
-                                board.cells[row][col].value = board.cells[row][col].temp
-                                BOARD[row][col] = board.cells[row][col].temp
+                        temp = board.cells[row][col].temp
+                        if temp != 0:
+                            if board.valid(row, col, temp):
+                                before = board.snapshot()
+                                board.set_value(row, col, temp)
+                                engine.cell_changed(before, board.snapshot(), row, col)
+                                # The hint was for the old board
+                                want_hint = False
+                                analysis_changed = True
                                 key = None
                                 if board.is_finished():
                                     print("Game over")
@@ -186,10 +482,11 @@ def main():
                             else:
                                 print("Wrong move")
                                 strikes += 1
+                                status_changed = True
                                 if strikes >= 5:
                                     print("Too many mistakes. Game over.")
                                     run = False
-                                board.cells[row][col].set_temp(0)
+                                board.clear()
                                 key = None
 
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -202,10 +499,22 @@ def main():
         if board.selected and key is not None:
             board.place(key)
 
-        redraw_window(WIN, board, play_time, strikes)
-        pygame.display.update()
+        if analysis_changed:
+            shown = show_analysis(board, engine, want_hint, want_marks)
+            if shown != message:
+                message = shown
+                status_changed = True
+
+        dirty = board.draw_dirty(WIN)
+        if status_changed:
+            dirty.append(draw_status(WIN, play_time, strikes, message))
+        if dirty:
+            pygame.display.update(dirty)
+    pygame.time.set_timer(CLOCK_TICK, 0)
+    engine.close()
 
 def valid(board, num, pos):
+    box = isqrt(len(board))
     # Check row
     for i in range(len(board[0])):
         if board[pos[0]][i] == num and pos[1] != i:
@@ -215,13 +524,14 @@ def valid(board, num, pos):
         if board[i][pos[1]] == num and pos[0] != i:
             return False
     # Check box
-    box_x = pos[1] // 3
-    box_y = pos[0] // 3
-    for i in range(box_y * 3, box_y * 3 + 3):
-        for j in range(box_x * 3, box_x * 3 + 3):
+    box_x = pos[1] // box
+    box_y = pos[0] // box
+    for i in range(box_y * box, box_y * box + box):
+        for j in range(box_x * box, box_x * box + box):
             if board[i][j] == num and (i, j) != pos:
                 return False
     return True
 
 if __name__ == "__main__":
-    main()
+    # python sudoku.py [box size] [easy|medium|hard|expert]
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3, sys.argv[2] if len(sys.argv) > 2 else None)
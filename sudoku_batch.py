@@ -0,0 +1,139 @@
+import sys
+import time
+
+import numpy as np
+
+from sudoku_solver import geometry, solve, parse, symbols
+
+# Sudoku for M puzzles at once. Puzzles are rows of one (M, cells) uint8
+# array of digits (0 = empty); candidate masks come from row, column and box
+# OR-reductions over the whole batch, and naked and hidden singles are placed
+# in lockstep until every puzzle is solved, contradicted or stuck. Only the
+# stuck ones go on to the scalar search in sudoku_solver.
+
+# Per-puzzle status after propagate()
+stuck, solved, invalid = 0, 1, -1
+
+_indices = {}
+
+
+def _unit_indices(box):
+    # (units, cells in unit) and (cells, 3 unit indices) index arrays
+    if box not in _indices:
+        geo = geometry(box)
+        _indices[box] = (np.array(geo.units, dtype=np.int64),
+                         np.array(geo.cell_units, dtype=np.int64))
+    return _indices[box]
+
+
+def load(lines, box=3):
+    # Puzzle strings ('0' or '.' for blanks, letters above 9) to an (M, cells)
+    # array. Raises ValueError for a line of the wrong length or with a
+    # symbol that is not a digit of this grid size.
+    n = box * box
+    table = np.full(256, 255, dtype=np.uint8)   # 255 marks unknown symbols
+    table[ord('0')] = table[ord('.')] = 0
+    for digit, symbol in enumerate(symbols[:n], 1):
+        table[ord(symbol)] = table[ord(symbol.lower())] = digit
+    lines = [line.strip() for line in lines]
+    for number, line in enumerate(lines, 1):
+        if len(line) != n * n:
+            raise ValueError(f'line {number}: expected {n * n} characters, got {len(line)}')
+    data = np.frombuffer(''.join(lines).encode('ascii'), dtype=np.uint8)
+    values = table[data].reshape(-1, n * n)
+    unknown = (values == 255).any(axis=1)
+    if unknown.any():
+        raise ValueError(f'line {np.argmax(unknown) + 1}: unknown symbol')
+    return values
+
+
+def _bits(values):
+    return np.where(values > 0, np.left_shift(1, values.astype(np.uint32) - 1, dtype=np.uint32), 0).astype(np.uint32)
+
+
+def _digits(bits):
+    # Single-bit masks to digits: frexp gives the exponent plus one
+    return np.frexp(bits.astype(np.float64))[1].astype(np.uint8)
+
+
+def propagate(values, box=3):
+    # Fills in every single, in place; returns the status of each puzzle
+    units, cell_units = _unit_indices(box)
+    n = box * box
+    all_digits = np.uint32((1 << n) - 1)
+    status = np.full(len(values), stuck, dtype=np.int8)
+    active = np.arange(len(values))
+    while len(active):
+        board = values[active]
+        bits = _bits(board)[:, units]                      # (k, units, n)
+        used = np.bitwise_or.reduce(bits, axis=2)
+        # A digit given twice in a unit makes the sum differ from the OR
+        broken = (bits.sum(axis=2, dtype=np.uint32) != used).any(axis=1)
+        free = all_digits & ~(used[:, cell_units[:, 0]] | used[:, cell_units[:, 1]]
+                              | used[:, cell_units[:, 2]])
+        empty = board == 0
+        candidates = np.where(empty, free, 0).astype(np.uint32)
+        broken |= (empty & (candidates == 0)).any(axis=1)
+        # Digits with exactly one place in a unit, and units where some digit has none
+        grouped = candidates[:, units]
+        once = np.zeros(used.shape, dtype=np.uint32)
+        twice = np.zeros(used.shape, dtype=np.uint32)
+        for k in range(n):
+            twice |= once & grouped[:, :, k]
+            once |= grouped[:, :, k]
+        broken |= ((once | used) != all_digits).any(axis=1)
+        hidden = once & ~twice
+        forced = candidates & (hidden[:, cell_units[:, 0]] | hidden[:, cell_units[:, 1]]
+                               | hidden[:, cell_units[:, 2]])
+        naked = empty & (candidates & (candidates - 1) == 0)
+        forced = np.where(naked, candidates, forced)
+        # A cell forced to two digits at once has no solution
+        broken |= (forced & (forced - 1) != 0).any(axis=1)
+        place = (forced != 0) & ~broken[:, None]
+        board[place] = _digits(forced[place])
+        values[active] = board
+        done = ~broken & ~(board == 0).any(axis=1)
+        status[active[broken]] = invalid
+        status[active[done]] = solved
+        active = active[~broken & ~done & place.any(axis=1)]
+    return status
+
+
+def solve_batch(values, box=3):
+    # Solves an (M, cells) array in place; returns a bool array of which have
+    # a solution. Propagation alone settles most puzzles, the rest are
+    # searched one at a time.
+    n = box * box
+    status = propagate(values, box)
+    for i in np.flatnonzero(status == stuck):
+        grid = solve(values[i].reshape(n, n).tolist())
+        if grid is None:
+            status[i] = invalid
+        else:
+            values[i] = np.array(grid, dtype=np.uint8).ravel()
+            status[i] = solved
+    return status == solved
+
+
+if __name__ == '__main__':
+    # python sudoku_batch.py puzzles.txt: batch vs one-at-a-time throughput
+    with open(sys.argv[1]) as f:
+        lines = [line.split()[0] for line in f if line.strip()]
+    size = len(lines[0])
+    box = {16: 2, 81: 3, 256: 4, 625: 5}[size]
+    lines = [line for line in lines if len(line) == size]
+    start = time.perf_counter()
+    values = load(lines, box)
+    status = propagate(values.copy(), box)
+    propagated = time.perf_counter() - start
+    start = time.perf_counter()
+    ok = solve_batch(values, box)
+    elapsed = time.perf_counter() - start
+    print(f'{len(lines)} puzzles, {np.count_nonzero(status == solved)} solved by propagation alone '
+          f'({propagated:.3f}s)')
+    print(f'batch: {ok.sum()} solved in {elapsed:.3f}s, {len(lines) / elapsed:,.0f} puzzles/s')
+    start = time.perf_counter()
+    for line in lines:
+        solve(parse(line))
+    scalar = time.perf_counter() - start
+    print(f'scalar: {scalar:.3f}s, {len(lines) / scalar:,.0f} puzzles/s ({scalar / elapsed:.1f}x)')
@@ -0,0 +1,73 @@
+import sys
+import time
+
+from sudoku_solver import solve, count_solutions, parse
+
+# Benchmarks for the Sudoku solver: python sudoku_bench.py [rounds] [sizes...]
+
+# Well-known hard puzzles (Norvig's hardest list, Inkala's 2010 and 2012 puzzles,
+# a 17-clue minimal puzzle), all with a unique solution
+puzzles = [
+    '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+    '52...6.........7.13...........4..8..6......5...........418.........3..2...87.....',
+    '6.....8.3.4.7.................5.4.7.3..2.....1.6.......2.....5.....8.6......1....',
+    '48.3............71.2.......7.5....6....2..8.............1.76...3.....4......5....',
+    '....14....3....2...7..........9...3.6.1.............8.2.....1.4....5.6.....7.8...',
+    '8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..',
+    '..53.....8......2..7..1.5..4....53...1..7...6..32...8..6.5....9..4....3......97..',
+    '85...24..72......9..4.........1.7..23.5...9...4...........8..7..17..........36.4.',
+    '..2.3...8.....8....31.2.....6..5.27..1.....5.2.4.6..31....8.6.5.......13..531.4..',
+    '12.3....435....1....4........54..2..6...7.........8.9...31..5.......9.7.....6...8',
+    '1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..',
+    '..............3.85..1.2.......5.7.....4...1...9.......5......73..2.1........4...9',
+    '.2.4.37.........32........4.4.2...7.8...5.........1...5.....9...3.9....7..1..86..',
+]
+
+# Generated with sudoku_generator: 16x16 with every removable clue removed,
+# 25x25 stopped at 320 clues plus one at 314
+puzzles_16 = [
+    '...5.9.6....F...E26..73...9...1..3.4.E.B.5..6C.9....C.4..B7........7.C..A....5.8.B.....7EDG9..4F6.A............7..4G.6.E.F.79....7..A3..2.F..86....8......E....43F..G..467.....5B...9.72.C....ED..D.6.....8.B.CEC.2A.8...G.....1.15....A.26E4.8...B9..25...3..G.',
+    '.1...86...D.GC3.5..3...B6F..7.D.D.G..7....2......6B.9E..C.3..25.F.7.A.3...EC.....4.D.6.F2...C..8..5..D.....4..G6..8.5.C.7...24B......A........2.29CB....D....G..A.35....92.18...E.....5...B...6F...4...G..C.D8.5G.D..3E6.8.94..........9A.1E.....2E..C.....GB..9',
+    '...FE..6.G3...C..G.B.2...A.CEF.D2C..5GA......98.D.....9B21F.A6G..7.A3..1...8..FE..D.F....E7....A8B.4.E.216.9.D..G.....85.CB.6..2.F................28....E..5F.4.5....7.843.6...9..C.9...B..A.G6..6.7......5.......1...5..9..2.AC.....8......51..E.B....D....G..4',
+    'A...71...8.9BD347F.....2...4.......183B.......F.......6.3..C.9............F32..5.1..B...5.7...A.4A..2...B.G68..C.C5...8..42...71G....5.......81..D.B..F46.9...C7571.G..8..CD..69.....9C......B.EF6..4...1.5.A...C.9..G.3AE.7.......89..5......2.25.A......6B..9F',
+]
+puzzles_25 = [
+    '4O.D.73..29....1.......H..8.5C.K.....N3.ME7I.G...J....HP.C....K.M....NO.7.B.E.K7.5.I.B..2GLHCAO4NM.9.2LB1.MOF.7.H..P...96CAKEH1.J8EBK.....M....4P.F3...KEPN4D2.A..7H3.91..LOC....DF....P1.54I.E7.OAKB.M.O5.M.....3.B.1.J...I..8EA..B7LOJM5.N.FK.2...G91H.P..P8.AG..NC...DFI.E.M.1..KD......2EM9...7.N...3.....M...1.LF4..N....P.7..O.EN6..9.IO531L.KH.8CD.J..22....M.H3DE.........P.FNK.P9I.2NA.L.HE....BJ....CD...6.KF..72D3..G5L1.HP9.4..2.KG4..MP......6..E8.B.GBHL.....O.NM.6A4.D23K...74.1D36P.8.K......N.I2O.M1H....2.MKI.D....EF.B6N9...8N.BE3.PO.AJ16LI.H5.KF....EP.A.8C.62..4..B1.HI.O.FKO3.....H..9..DM.C2.L8.LIC.....DH..B..KG.9....P.',
+    '....NF2..D63..B.9..5.OHK...I9.4P....AEL1.J.......5...PF..JN8...K5L4D.EA..M.4.E...A.L.FI..8.HNM2..D6..5M2.O..63..GDNB.A.IJ8F.LF..7A.5H3.END6.2.I9B.......NI.6F.813..27.OC....K.9O2...CLG..A451..N.....7...D..3A.O.2..L.HP..516.NB.G.451D.P..8..MO.......2I.3.BA.1.N.MP.H.2....JEG..4.K..I.G64.O.9AFE5PCH.J3L.6.G.....2F.5B.E3A4.MI..PN2..E7.3..I..JGD...8OMH..BM.O.PEDC.J..3.LN2....K5...E....M3....2....7..F...I...G...5JO.8I9KM.3L.D.4..J....I87....FNAH...KL2EO.7.9.2N4F...L.3PJIEODK68.A.N.8O..D..G7.E..F..C3..JP.O2..M...6L.A.GD..E..5.87L.5K..19P.C2..M..FJ8.E.3..HC6...8DN..7.3..2AP..J9..M7..5.2....8I.1....BL.F...1F.3J4..D..O..MBN..I..K',
+    '.I....4.M...3..J5...FHBE2...9.AL..C.K.67M...3.58D.P.MHF5NKJ...B.LE8...CA.9...DL..3....2....P94.6JM.1E.BJ3O28H.A..M5F6......K....B1.G.9.M.8.6.KI.J4..H.D...91.CFK.B..N8.OE4A2..6.J..IHDA8P7.G4..9C.5.OEL......LJ62..59.C.BA..MI...AP...I...MD....H..6..75G.N..7..F.PIE.DA..OK.6.G15.G.O1.K....6H....4.F8J.INAK..C6NO.43.1..B7.DA.2.L.99.E3.BH7..O....G.J.2K.F6..A.I.D.EG6.9.K85M..N.B.CH....BGI...C.J1K.2..MD3....CI......45MA8.K...7..H2N8..E.JA5K...O.2PD6..B1.4C.3.4..MD...7.B..A..G.8...1..AK38H...6P..I...E5....3H9O.....AK...ED..8PGN......2.....L..M.1..GH93FJ.....D.P.3..9G.5AC..KB.L.I8BF5P.9CGD.3.6IH...7L..AM.J.1G..KM..B8..FON...P697.',
+    '..HO5....P....6JE7.B.N.A..KE..AJ.....O2BLI..M9.F4PCALB4..F32.K...195..8J..II.2.....L.N37FMO.K..H5.1C.NGP9MOH5.IL..A.3.CF2DEB..7A..JH..D8..3O.C1....5E...1...P.B...H.K7.IM..3.J8..3I..A.E..GDMCK..J.1...9.HK..5M.O.B..IJEN...G.PC.5C.JGN.4.IE1..LB......MO....K.8.326G7M1I.5DECL...J.......5.......GA.P..H4...3.L..B...6.A..N1M..7F...6ENCH....9F8.B.2L.4JM1...J...M..N.....L..8F...A...GL8.....75AMP6.3.JI1E4B.F.I.APLC..E12.G5.....3.K.....3..2.1.OB.K.CP9.EJ7A.5..BE1P.KF..J.C..G...O....7.4.K.8.6..E..F.....P..91E.C.7O..I..F.A..M..K5B13.B1..L..G.A..NPD...9...8..F.JG3...CB....9..2...P.KAK..4......3IB.18HEF.DC.L2O.IN2F...L7CK.8D....49JG.',
+]
+corpora = {9: puzzles, 16: puzzles_16, 25: puzzles_25}
+
+
+def bench(function, boards, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board in boards:
+            function(board)
+    elapsed = time.perf_counter() - start
+    solved = len(boards) * rounds
+    print(f'{function.__name__}: {solved} puzzles in {elapsed:.3f}s')
+    print(f'  {solved / elapsed:,.1f} puzzles/s, {elapsed / solved * 1000:.2f} ms/puzzle')
+
+
+def slowest(lines, boards):
+    timings = []
+    for line, board in zip(lines, boards):
+        start = time.perf_counter()
+        solve(board)
+        timings.append((time.perf_counter() - start, line))
+    elapsed, line = max(timings)
+    print(f'slowest: {elapsed * 1000:.1f} ms for puzzle {lines.index(line)}')
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sizes = [int(arg) for arg in sys.argv[2:]] or list(corpora)
+    for size in sizes:
+        lines = corpora[size]
+        boards = [parse(line) for line in lines]
+        print(f'{size}x{size}, {len(lines)} puzzles')
+        bench(solve, boards, rounds)
+        bench(count_solutions, boards, rounds)
+        slowest(lines, boards)
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from sudoku_solver import solve, count_solutions, format_board
+
+# Puzzle generator: a random complete grid, then clues are removed in random
+# order as long as count_solutions still proves the puzzle unique. Batches are
+# sharded over a process pool; each shard has its own seed, so the output for
+# a given seed is the same whatever the number of workers.
+
+
+def random_grid(rng, box=3):
+    # The diagonal boxes never constrain each other, so filling them at
+    # random and solving the rest gives a valid grid (a 4x4 fill can be a dead
+    # end, so retry); shuffling digits, rows within bands and the bands
+    # themselves varies the solver's completion.
+    n = box * box
+    grid = None
+    while grid is None:
+        board = [[0] * n for _ in range(n)]
+        for b in range(box):
+            digits = rng.sample(range(1, n + 1), n)
+            for i, digit in enumerate(digits):
+                board[b * box + i // box][b * box + i % box] = digit
+        grid = solve(board)
+    relabel = [0] + rng.sample(range(1, n + 1), n)
+    bands = rng.sample(range(box), box)
+    order = [band * box + row for band in bands for row in rng.sample(range(box), box)]
+    grid = [[relabel[digit] for digit in grid[row]] for row in order]
+    if rng.random() < 0.5:
+        grid = [list(column) for column in zip(*grid)]
+    return grid
+
+
+def make_puzzle(rng, clues=25, box=3):
+    # Returns (puzzle, solution). Stops at `clues` givens, or earlier when no
+    # further clue can be removed without losing uniqueness.
+    n = box * box
+    solution = random_grid(rng, box)
+    puzzle = [row[:] for row in solution]
+    remaining = n * n
+    for cell in rng.sample(range(n * n), n * n):
+        if remaining <= clues:
+            break
+        row, col = divmod(cell, n)
+        digit = puzzle[row][col]
+        puzzle[row][col] = 0
+        if count_solutions(puzzle, 2) == 1:
+            remaining -= 1
+        else:
+            puzzle[row][col] = digit
+    return puzzle, solution
+
+
+def puzzle_line(puzzle):
+    return format_board(puzzle, '.')
+
+
+def _generate_shard(job):
+    seed, shard, count, clues = job
+    rng = random.Random(seed * 1000003 + shard)
+    return [puzzle_line(make_puzzle(rng, clues)[0]) for _ in range(count)]
+
+
+def generate(path, count, clues=25, seed=0, workers=None, shard_size=50):
+    # Streams `count` puzzles to path, one 81-character line each; returns
+    # the number written
+    workers = os.cpu_count() if workers is None else workers
+    jobs = [(seed, shard, min(shard_size, count - start), clues)
+            for shard, start in enumerate(range(0, count, shard_size))]
+    written = 0
+    with open(path, 'w') as out:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                # imap keeps shard order; each shard is written as soon as it
+                # and every shard before it are done
+                for lines in pool.imap(_generate_shard, jobs):
+                    out.write('\n'.join(lines) + '\n')
+                    written += len(lines)
+        else:
+            for job in jobs:
+                lines = _generate_shard(job)
+                out.write('\n'.join(lines) + '\n')
+                written += len(lines)
+    return written
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python sudoku_generator.py out.txt [count] [clues] [workers] [seed]')
+        sys.exit(1)
+    path = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    clues = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else int(time.time())
+    start = time.perf_counter()
+    written = generate(path, count, clues, seed, workers)
+    elapsed = time.perf_counter() - start
+    print(f'{written} puzzles in {elapsed:.2f}s ({written / elapsed:,.1f} puzzles/s) -> {path}')
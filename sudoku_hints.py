@@ -0,0 +1,202 @@
+import queue
+import threading
+from collections import OrderedDict, namedtuple
+
+from sudoku_library import locked_candidates, naked_pairs
+from sudoku_solver import box_size, geometry, solve
+
+# Hints for the Sudoku UI. analyse() finds the next digit a human could place
+# and every empty cell's pencil marks; HintEngine runs it on a worker thread
+# against board snapshots and caches the results per board state.
+
+# cell and reasons are (row, col); reasons are the placed digits that rule
+# the alternatives out, and the segment or pair cells of any locked
+# candidates or naked pair that did
+Hint = namedtuple('Hint', 'technique cell digit reasons')
+# marks holds each cell's candidate mask (bit d-1 = digit d, 0 when filled)
+Analysis = namedtuple('Analysis', 'hint marks')
+
+# Hints that only hold for the board they were made for
+_guesses = ('from the solution', 'no solution from here')
+
+
+def _blocker(values, geo, i, bit, skip=()):
+    # A peer of cell i, outside skip, holding the digit bit
+    for peer in geo.peers[i]:
+        if values[peer] == bit and peer not in skip:
+            return peer
+    return None
+
+
+def _why(values, geo, eliminated, i, bit, skip=()):
+    # The cells showing cell i can't hold the digit bit: a peer holding it,
+    # else the causes of the step that cleared it
+    peer = _blocker(values, geo, i, bit, skip)
+    if peer is not None:
+        return (peer,)
+    return eliminated.get((i, bit), ())
+
+
+def _naked_single(values, candidates, geo, eliminated):
+    for i in range(geo.cells):
+        mask = candidates[i]
+        if mask and not mask & (mask - 1):
+            reasons = []
+            for digit in range(geo.size):
+                bit = 1 << digit
+                if bit != mask:
+                    for cell in _why(values, geo, eliminated, i, bit):
+                        if cell not in reasons:
+                            reasons.append(cell)
+            return 'naked single', i, mask, reasons
+    return None
+
+
+def _hidden_single(values, candidates, geo, eliminated):
+    n = geo.size
+    # Boxes first, as people look for these there first
+    for kind, start in (('box', 2 * n), ('row', 0), ('column', n)):
+        for unit in geo.units[start:start + n]:
+            once = twice = 0
+            for i in unit:
+                twice |= once & candidates[i]
+                once |= candidates[i]
+            single = once & ~twice
+            if single:
+                bit = single & -single
+                target = next(i for i in unit if candidates[i] & bit)
+                members = set(unit)
+                reasons = []
+                for i in unit:
+                    if i != target and not values[i]:
+                        for cell in _why(values, geo, eliminated, i, bit, members):
+                            if cell != target and cell not in reasons:
+                                reasons.append(cell)
+                return 'hidden single in ' + kind, target, bit, reasons
+    return None
+
+
+def analyse(state):
+    # state is the board as a tuple of rows; returns an Analysis
+    n = len(state)
+    geo = geometry(box_size(n))
+    values = [1 << (digit - 1) if digit else 0 for row in state for digit in row]
+    used = [0] * (3 * n)
+    for i, units in enumerate(geo.cell_units):
+        for u in units:
+            used[u] |= values[i]
+    marks = tuple(0 if values[i] else geo.all_digits & ~(used[a] | used[b] | used[c])
+                  for i, (a, b, c) in enumerate(geo.cell_units))
+    if all(values):
+        return Analysis(None, marks)
+    candidates = list(marks)
+    steps = []
+    # (cell, bit) -> the cells of the step that cleared that candidate
+    eliminated = {}
+    while True:
+        found = (_hidden_single(values, candidates, geo, eliminated)
+                 or _naked_single(values, candidates, geo, eliminated))
+        if found:
+            technique, i, bit, reasons = found
+            if steps:
+                technique += ' after ' + ' and '.join(steps)
+            return Analysis(Hint(technique, divmod(i, n), bit.bit_length(),
+                                 tuple(divmod(peer, n) for peer in reasons)), marks)
+        removed = locked_candidates(candidates, geo)
+        if removed:
+            technique = 'locked candidates'
+        else:
+            removed = naked_pairs(candidates, geo)
+            if not removed:
+                break
+            technique = 'naked pair'
+        for i, bit, causes in removed:
+            eliminated[i, bit] = causes
+        if technique not in steps:
+            steps.append(technique)
+    # Nothing a person would spot: reveal a cell with the fewest candidates
+    solution = solve([list(row) for row in state])
+    if solution is None:
+        return Analysis(Hint('no solution from here', None, 0, ()), marks)
+    i = min((i for i in range(geo.cells) if not values[i]), key=lambda i: marks[i].bit_count())
+    row, col = divmod(i, n)
+    return Analysis(Hint('from the solution', (row, col), solution[row][col], ()), marks)
+
+
+def update(analysis, state, row, col):
+    # The analysis after a digit was placed at (row, col), now state, or None
+    # when it has to be redone: when the cell was emptied, or the hint is
+    # used up or contradicted. Any other placement only removes candidates.
+    digit = state[row][col]
+    hint = analysis.hint
+    if digit == 0 or hint is None or hint.technique in _guesses:
+        return None
+    geo = geometry(box_size(len(state)))
+    n = geo.size
+    i = row * n + col
+    target = hint.cell[0] * n + hint.cell[1]
+    if i == target or (digit == hint.digit and target in geo.peers[i]):
+        return None
+    bit = 1 << (digit - 1)
+    marks = list(analysis.marks)
+    marks[i] = 0
+    for peer in geo.peers[i]:
+        marks[peer] &= ~bit
+    return Analysis(hint, tuple(marks))
+
+
+class HintEngine:
+    # Analyses board states on a worker thread. request() returns a cached
+    # result at once or queues the state; on_ready is called from the worker
+    # thread whenever a new result is cached.
+    def __init__(self, on_ready=None, cache_size=256):
+        self.on_ready = on_ready
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _store(self, state, analysis):
+        with self.lock:
+            self.cache[state] = analysis
+            self.cache.move_to_end(state)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def lookup(self, state):
+        with self.lock:
+            return self.cache.get(state)
+
+    def request(self, state):
+        analysis = self.lookup(state)
+        if analysis is None:
+            self.requests.put(state)
+        return analysis
+
+    def cell_changed(self, before, after, row, col):
+        # Carries the analysis of before over to after when one digit placed
+        # at (row, col) leaves it valid, so no new analysis is needed
+        analysis = self.lookup(before)
+        if analysis is not None and self.lookup(after) is None:
+            updated = update(analysis, after, row, col)
+            if updated is not None:
+                self._store(after, updated)
+
+    def _run(self):
+        while True:
+            state = self.requests.get()
+            # Only the newest request matters; older boards are gone
+            while not self.requests.empty():
+                state = self.requests.get_nowait()
+            if state is None:
+                return
+            if self.lookup(state) is None:
+                self._store(state, analyse(state))
+                if self.on_ready is not None:
+                    self.on_ready()
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
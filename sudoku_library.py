@@ -0,0 +1,260 @@
+import mmap
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from sudoku_solve import solve_chunks
+from sudoku_solver import count_solutions, geometry, locked_eliminations, parse
+
+# On-disk library of 9x9 puzzles. Each puzzle is 41 bytes (two cells per
+# byte, 0 = empty). Records are grouped by difficulty, and the header lists
+# each group's offset and count. The file is memory-mapped and a record is
+# read by seeking, so opening it costs the same whatever its size.
+#
+# Difficulty is the hardest technique a human solver needs, using the
+# simplest technique that makes progress at each step.
+
+difficulties = ('easy', 'medium', 'hard', 'expert')
+# easy: naked and hidden singles; medium: locked candidates; hard: naked
+# pairs; expert: none of these finish it, so guessing is needed
+
+magic = b'SDKL'
+version = 1
+_header = struct.Struct('<4sBB')     # magic, version, number of difficulties
+_bucket = struct.Struct('<QQ')       # offset of the first record, record count
+record_size = 41
+
+
+def pack(board):
+    cells = [digit for row in board for digit in row] + [0]
+    return bytes(cells[i] << 4 | cells[i + 1] for i in range(0, 82, 2))
+
+
+def unpack(data):
+    cells = []
+    for byte in data:
+        cells.append(byte >> 4)
+        cells.append(byte & 15)
+    return [cells[r * 9:r * 9 + 9] for r in range(9)]
+
+
+def _place(values, candidates, geo, i, bit):
+    values[i] = bit
+    candidates[i] = 0
+    for peer in geo.peers[i]:
+        candidates[peer] &= ~bit
+
+
+def _singles(values, candidates, geo):
+    # Places every naked and hidden single found in one sweep; returns
+    # whether any were placed, or None on a contradiction
+    placed = False
+    for i in range(geo.cells):
+        mask = candidates[i]
+        if mask and not mask & (mask - 1):
+            _place(values, candidates, geo, i, mask)
+            placed = True
+    for unit in geo.units:
+        once = twice = 0
+        for i in unit:
+            mask = candidates[i]
+            twice |= once & mask
+            once |= mask
+        single = once & ~twice
+        while single:
+            bit = single & -single
+            single ^= bit
+            for i in unit:
+                if candidates[i] & bit:
+                    _place(values, candidates, geo, i, bit)
+                    placed = True
+                    break
+            else:
+                # Its only cell was filled earlier in the sweep
+                return None
+    return placed
+
+
+def locked_candidates(candidates, geo):
+    # Clears what sudoku_solver.locked_eliminations rules out. Returns a
+    # (cell, bit, causes) per candidate cleared, causes being the segment's
+    # cells that still hold the digit.
+    removed = []
+    for i, bit, s in locked_eliminations(candidates, geo):
+        candidates[i] &= ~bit
+        removed.append((i, bit, tuple(j for j in geo.segments[s][0] if candidates[j] & bit)))
+    return removed
+
+
+def naked_pairs(candidates, geo):
+    # Two cells of a unit with the same two candidates take both digits.
+    # Returns a (cell, bit, causes) per candidate cleared, causes being the
+    # pair.
+    removed = []
+    for unit in geo.units:
+        pairs = {}
+        for i in unit:
+            mask = candidates[i]
+            if mask.bit_count() == 2:
+                pairs.setdefault(mask, []).append(i)
+        for mask, cells in pairs.items():
+            if len(cells) != 2:
+                continue
+            for i in unit:
+                cleared = candidates[i] & mask
+                if i not in cells and cleared:
+                    candidates[i] &= ~mask
+                    while cleared:
+                        bit = cleared & -cleared
+                        cleared ^= bit
+                        removed.append((i, bit, tuple(cells)))
+    return removed
+
+
+def grade(board):
+    # Index into difficulties, or None unless the puzzle has exactly one
+    # solution
+    geo = geometry(3)
+    values = [0] * geo.cells
+    candidates = [geo.all_digits] * geo.cells
+    for r in range(9):
+        for c in range(9):
+            if board[r][c]:
+                bit = 1 << (board[r][c] - 1)
+                if not candidates[r * 9 + c] & bit:
+                    return None
+                _place(values, candidates, geo, r * 9 + c, bit)
+    level = 0
+    while True:
+        empty = [i for i in range(geo.cells) if not values[i]]
+        if not empty:
+            return level
+        if not all(candidates[i] for i in empty):
+            return None
+        placed = _singles(values, candidates, geo)
+        if placed is None:
+            return None
+        if placed:
+            continue
+        if locked_candidates(candidates, geo):
+            level = max(level, 1)
+        elif naked_pairs(candidates, geo):
+            level = max(level, 2)
+        else:
+            # Every step above is a sound deduction, so only a puzzle they
+            # can't finish may have no solution or several
+            return 3 if count_solutions(board) == 1 else None
+
+
+def _grade_chunk(lines):
+    # (difficulty, record) for every valid 81-character puzzle line
+    records = []
+    for line in lines:
+        line = line.strip()
+        if len(line) != 81:
+            continue
+        board = parse(line)
+        level = grade(board)
+        if level is not None:
+            records.append((level, pack(board)))
+    return records
+
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build(path, lines, workers=None, chunk_size=1000):
+    # Grades and packs puzzle lines into a library at path; returns the count
+    # per difficulty. Records are spooled to one temporary file per
+    # difficulty, so memory use does not depend on the number of puzzles.
+    workers = os.cpu_count() if workers is None else workers
+    spools = [tempfile.TemporaryFile() for _ in difficulties]
+    counts = [0] * len(difficulties)
+    try:
+        for records in solve_chunks(_chunks(lines, chunk_size), workers, function=_grade_chunk):
+            for level, record in records:
+                spools[level].write(record)
+                counts[level] += 1
+        with open(path, 'wb') as out:
+            out.write(_header.pack(magic, version, len(difficulties)))
+            offset = _header.size + _bucket.size * len(difficulties)
+            for count in counts:
+                out.write(_bucket.pack(offset, count))
+                offset += count * record_size
+            for spool in spools:
+                spool.seek(0)
+                shutil.copyfileobj(spool, out)
+    finally:
+        for spool in spools:
+            spool.close()
+    return dict(zip(difficulties, counts))
+
+
+class Library:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        tag, file_version, count = _header.unpack_from(self.data)
+        if tag != magic or file_version != version:
+            self.close()
+            raise ValueError('not a Sudoku library')
+        self.buckets = [_bucket.unpack_from(self.data, _header.size + k * _bucket.size)
+                        for k in range(count)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __len__(self):
+        return sum(count for _, count in self.buckets)
+
+    def count(self, difficulty):
+        return self.buckets[difficulties.index(difficulty)][1]
+
+    def get(self, difficulty, index):
+        offset, count = self.buckets[difficulties.index(difficulty)]
+        if not 0 <= index < count:
+            raise IndexError(index)
+        start = offset + index * record_size
+        return unpack(self.data[start:start + record_size])
+
+    def random(self, difficulty=None, rng=random):
+        # A random puzzle of the given difficulty, or of any when None
+        if difficulty is not None:
+            return self.get(difficulty, rng.randrange(self.count(difficulty)))
+        # Buckets are stored back to back, so any record index will do
+        start = self.buckets[0][0] + rng.randrange(len(self)) * record_size
+        return unpack(self.data[start:start + record_size])
+
+
+if __name__ == '__main__':
+    # python sudoku_library.py puzzles.txt library.sdk [workers]
+    if len(sys.argv) < 3:
+        print('usage: python sudoku_library.py puzzles.txt library.sdk [workers]')
+        sys.exit(1)
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    start = time.perf_counter()
+    with open(sys.argv[1]) as f:
+        counts = build(sys.argv[2], f, workers)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f'{total} puzzles in {elapsed:.2f}s ({total / elapsed:,.0f} puzzles/s) -> {sys.argv[2]}')
+    print(', '.join(f'{name}: {count}' for name, count in counts.items()))
@@ -0,0 +1,189 @@
+from collections import deque
+from functools import lru_cache
+from itertools import combinations
+
+# Sudoku rules as objects, for variants. A rule watches a tuple of cells
+# (row-major indices) and narrows their domains: candidate masks, bit d-1 =
+# digit d, where a placed digit is a single bit. propagate() returns the
+# cells it narrowed, or None on a contradiction. Engine runs the rules as a
+# worklist, revisiting only rules that watch a cell that changed.
+
+
+class AllDifferent:
+    # A row, column, box, diagonal or any other region without repeats
+    def __init__(self, cells):
+        self.cells = tuple(cells)
+
+    def propagate(self, domains):
+        cells = self.cells
+        narrowed = []
+        while True:
+            fixed = once = twice = 0
+            for i in cells:
+                mask = domains[i]
+                if not mask & (mask - 1):
+                    if fixed & mask or not mask:
+                        return None
+                    fixed |= mask
+                twice |= once & mask
+                once |= mask
+            count = once.bit_count()
+            if count < len(cells):
+                return None
+            # With as many digits as cells, every digit must go somewhere, so
+            # a digit with one place left is a hidden single
+            required = count == len(cells)
+            changed = False
+            for i in cells:
+                mask = domains[i]
+                if mask & (mask - 1):
+                    new = mask & ~fixed
+                    if required:
+                        hidden = new & ~twice
+                        if hidden:
+                            if hidden & (hidden - 1):
+                                return None
+                            new = hidden
+                    if new != mask:
+                        if not new:
+                            return None
+                        domains[i] = new
+                        narrowed.append(i)
+                        changed = True
+            if not changed:
+                return narrowed
+
+
+@lru_cache(maxsize=4096)
+def _sum_combinations(digits, count, total):
+    # Masks of count distinct digits from the mask digits that add up to total
+    present = [d for d in range(1, digits.bit_length() + 1) if digits >> (d - 1) & 1]
+    return tuple(sum(1 << (d - 1) for d in combo)
+                 for combo in combinations(present, count) if sum(combo) == total)
+
+
+class Cage(AllDifferent):
+    # Killer cage: different digits adding up to total
+    def __init__(self, cells, total):
+        super().__init__(cells)
+        self.total = total
+
+    def propagate(self, domains):
+        cells = self.cells
+        narrowed = AllDifferent.propagate(self, domains)
+        while narrowed is not None:
+            union = fixed = 0
+            for i in cells:
+                mask = domains[i]
+                union |= mask
+                if not mask & (mask - 1):
+                    fixed |= mask
+            # Digits of the sums still possible that keep the placed digits
+            allowed = 0
+            for combo in _sum_combinations(union, len(cells), self.total):
+                if combo & fixed == fixed:
+                    allowed |= combo
+            changed = False
+            for i in cells:
+                mask = domains[i]
+                if mask & ~allowed:
+                    mask &= allowed
+                    if not mask:
+                        return None
+                    domains[i] = mask
+                    narrowed.append(i)
+                    changed = True
+            if not changed:
+                return narrowed
+            more = AllDifferent.propagate(self, domains)
+            if more is None:
+                return None
+            narrowed += more
+        return None
+
+
+class Thermometer:
+    # Digits strictly increase from the bulb, cells[0], along the tube
+    def __init__(self, cells):
+        self.cells = tuple(cells)
+
+    def propagate(self, domains):
+        cells = self.cells
+        narrowed = []
+        # Each cell is above the lowest digit before it and below the highest
+        # after it; one pass each way settles every bound on a chain
+        floor = 0
+        for i in cells:
+            mask = domains[i] & ~((floor << 1) - 1) if floor else domains[i]
+            if mask != domains[i]:
+                if not mask:
+                    return None
+                domains[i] = mask
+                narrowed.append(i)
+            floor = mask & -mask
+        ceiling = 0
+        for i in reversed(cells):
+            mask = domains[i] & (ceiling - 1) if ceiling else domains[i]
+            if mask != domains[i]:
+                if not mask:
+                    return None
+                domains[i] = mask
+                narrowed.append(i)
+            ceiling = 1 << (mask.bit_length() - 1)
+        return narrowed
+
+
+def classic(box):
+    # The rows, columns and boxes of an N x N grid, N = box * box
+    n = box * box
+    return ([AllDifferent(r * n + c for c in range(n)) for r in range(n)]
+            + [AllDifferent(r * n + c for r in range(n)) for c in range(n)]
+            + [AllDifferent((b // box * box + r) * n + b % box * box + c
+                            for r in range(box) for c in range(box)) for b in range(n)])
+
+
+def diagonals(box):
+    # Both main diagonals, as in X-Sudoku
+    n = box * box
+    return [AllDifferent(i * n + i for i in range(n)),
+            AllDifferent(i * n + n - 1 - i for i in range(n))]
+
+
+class Engine:
+    def __init__(self, cells, rules):
+        self.rules = list(rules)
+        # Rules to revisit when a cell changes
+        self.watchers = [[] for _ in range(cells)]
+        for k, rule in enumerate(self.rules):
+            for i in rule.cells:
+                self.watchers[i].append(k)
+
+    def propagate(self, domains, changed=None):
+        # Narrows domains in place until no rule can; changed lists the cells
+        # narrowed since the last fixpoint (None runs every rule). Returns
+        # False on a contradiction.
+        rules, watchers = self.rules, self.watchers
+        if changed is None:
+            worklist = deque(range(len(rules)))
+            queued = [True] * len(rules)
+        else:
+            worklist = deque()
+            queued = [False] * len(rules)
+            for i in changed:
+                for k in watchers[i]:
+                    if not queued[k]:
+                        queued[k] = True
+                        worklist.append(k)
+        while worklist:
+            k = worklist.popleft()
+            queued[k] = False
+            narrowed = rules[k].propagate(domains)
+            if narrowed is None:
+                return False
+            for i in narrowed:
+                for w in watchers[i]:
+                    # Each rule leaves its own cells settled
+                    if not queued[w] and w != k:
+                        queued[w] = True
+                        worklist.append(w)
+        return True
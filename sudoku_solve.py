@@ -0,0 +1,110 @@
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sudoku_solver import solve, parse, format_board, symbols
+
+# Batch solver for puzzle files, one puzzle per line: 81 characters ('0' or
+# '.' for blanks), or 256 or 625 with letters above 9 for 16x16 and 25x25
+# grids: python sudoku_solve.py puzzles.txt [solutions.txt] [workers]
+#
+# The input is memory-mapped and cut into chunks of whole lines. The chunks
+# are solved in worker processes, and the results are written back in input
+# order. Only a few chunks are in flight at once, so memory use does not
+# depend on the file size. Each output line is the solution, or 'unsolvable'
+# or 'invalid'.
+
+chunk_bytes = 1 << 16
+# The characters allowed in a line, by line length
+_symbols = {n * n: ('0.' + symbols[:n] + symbols[:n].lower()).encode('ascii') for n in (4, 9, 16, 25)}
+
+
+def read_chunks(data, size=chunk_bytes):
+    # Yields byte slices of data of roughly `size` bytes, ending on a newline
+    start, end = 0, len(data)
+    while start < end:
+        stop = data.find(b'\n', min(start + size, end) - 1)
+        stop = end if stop == -1 else stop + 1
+        yield data[start:stop]
+        start = stop
+
+
+def solve_chunk(chunk):
+    # Returns (output bytes, solved, failed) for one chunk of input lines
+    out = []
+    solved = failed = 0
+    for line in chunk.split(b'\n'):
+        fields = line.split()
+        if not fields or fields[0].startswith(b'#'):
+            continue
+        puzzle = fields[0]
+        allowed = _symbols.get(len(puzzle))
+        if allowed is None or puzzle.translate(None, allowed):
+            out.append('invalid')
+            failed += 1
+            continue
+        solution = solve(parse(puzzle.decode('ascii')))
+        if solution is None:
+            out.append('unsolvable')
+            failed += 1
+        else:
+            out.append(format_board(solution))
+            solved += 1
+    if out:
+        out.append('')
+    return '\n'.join(out).encode('ascii'), solved, failed
+
+
+def solve_chunks(chunks, workers, window=4, function=solve_chunk):
+    # Yields function(chunk) for each chunk in input order with at most
+    # workers * window chunks submitted and not yet written. function must
+    # be a module-level function so worker processes can load it.
+    if workers <= 1:
+        yield from map(function, chunks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= workers * window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def solve_file(path, out, workers=None):
+    # Solves every puzzle in path, writing to the binary file out; returns
+    # (bytes read, solved, failed)
+    workers = os.cpu_count() if workers is None else workers
+    solved = failed = 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0, 0, 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for text, chunk_solved, chunk_failed in solve_chunks(read_chunks(data), workers):
+                out.write(text)
+                solved += chunk_solved
+                failed += chunk_failed
+    return size, solved, failed
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python sudoku_solve.py puzzles.txt [solutions.txt] [workers]', file=sys.stderr)
+        sys.exit(1)
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    start = time.perf_counter()
+    if len(sys.argv) > 2 and sys.argv[2] != '-':
+        with open(sys.argv[2], 'wb', buffering=1 << 20) as out:
+            size, solved, failed = solve_file(sys.argv[1], out, workers)
+    else:
+        size, solved, failed = solve_file(sys.argv[1], sys.stdout.buffer, workers)
+        sys.stdout.flush()
+    elapsed = time.perf_counter() - start
+    total = solved + failed
+    print(f'{total} puzzles ({solved} solved, {failed} failed) in {elapsed:.2f}s: '
+          f'{total / elapsed:,.0f} puzzles/s, {size / elapsed / 1e6:.2f} MB/s', file=sys.stderr)
@@ -0,0 +1,348 @@
+from math import isqrt
+
+from sudoku_rules import Engine, classic
+
+# Sudoku solver for any box size b (an N x N grid with N = b * b): candidates
+# are N-bit masks (bit d-1 = digit d). Placing a digit clears its bit from the
+# peers' masks, which is the same as keeping row, column and box occupancy
+# masks but never needs a rescan. Naked and hidden singles are propagated
+# before a minimum-remaining-values search. Variants with extra rules (see
+# sudoku_rules) are searched through the rule engine instead.
+
+# Digits above 9 are written as letters
+symbols = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class Geometry:
+    def __init__(self, box):
+        n = box * box
+        self.box = box
+        self.size = n
+        self.cells = n * n
+        self.all_digits = (1 << n) - 1
+        # Rows, then columns, then boxes
+        self.units = [rule.cells for rule in classic(box)]
+        # Indices of each cell's row, column and box in units
+        self.cell_units = [(r, n + c, 2 * n + r // box * box + c // box)
+                           for r in range(n) for c in range(n)]
+        cell_units = [[self.units[u] for u in units] for units in self.cell_units]
+        self.peers = [tuple(sorted({j for unit in cell_units[i] for j in unit} - {i}))
+                      for i in range(self.cells)]
+        # Segments are the intersections of a box with a row or a column, as
+        # (cells, rest of the line, rest of the box). A group is a box's row
+        # segments, a box's column segments or a line's segments, with the
+        # index of the rest to clear when a digit is confined to one of them.
+        self.segments = []
+        self.segment_groups = []
+        line_groups = {}
+        for b in range(n):
+            top, left = b // box * box, b % box * box
+            box_cells = set(self.units[2 * n + b])
+            for vertical in (False, True):
+                group = []
+                for t in range(box):
+                    if vertical:
+                        line = self.units[n + left + t]
+                    else:
+                        line = self.units[top + t]
+                    cells = [i for i in line if i in box_cells]
+                    group.append(len(self.segments))
+                    line_groups.setdefault((vertical, t + (left if vertical else top)), []).append(len(self.segments))
+                    self.segments.append((cells, [i for i in line if i not in box_cells],
+                                          [i for i in box_cells if i not in cells]))
+                self.segment_groups.append((group, 1))
+        for group in line_groups.values():
+            self.segment_groups.append((group, 2))
+
+
+_geometries = {}
+
+
+def geometry(box):
+    if box not in _geometries:
+        _geometries[box] = Geometry(box)
+    return _geometries[box]
+
+
+def box_size(size):
+    box = isqrt(size)
+    if box * box != size or not 1 < box <= 5:
+        raise ValueError(f'unsupported grid size {size}')
+    return box
+
+
+def _setup(board):
+    # State is [values, candidates, geometry]: a digit bit or 0, and a
+    # candidate mask (0 once filled) per cell. The givens go into row, column
+    # and box occupancy masks, which give every empty cell's candidates at once.
+    geo = geometry(box_size(len(board)))
+    n = geo.size
+    values = [0] * geo.cells
+    used = [0] * (3 * n)
+    for r in range(n):
+        for c in range(n):
+            digit = board[r][c]
+            if digit:
+                i = r * n + c
+                bit = 1 << (digit - 1)
+                for u in geo.cell_units[i]:
+                    if used[u] & bit:
+                        return None
+                    used[u] |= bit
+                values[i] = bit
+    candidates = [0 if values[i] else geo.all_digits & ~(used[a] | used[b] | used[c])
+                  for i, (a, b, c) in enumerate(geo.cell_units)]
+    state = [values, candidates, geo]
+    for i in range(geo.cells):
+        if values[i]:
+            continue
+        mask = candidates[i]
+        if not mask:
+            return None
+        if not mask & (mask - 1) and not _assign(state, i, mask):
+            return None
+    return state
+
+
+def _assign(state, i, bit):
+    # Places bit in cell i and propagates naked singles; False on contradiction
+    values, candidates, geo = state
+    peers = geo.peers
+    if values[i]:
+        # Already filled by propagation from an earlier given
+        return values[i] == bit
+    if not candidates[i] & bit:
+        return False
+    queue = [(i, bit)]
+    while queue:
+        i, bit = queue.pop()
+        if values[i]:
+            if values[i] != bit:
+                return False
+            continue
+        values[i] = bit
+        candidates[i] = 0
+        for peer in peers[i]:
+            mask = candidates[peer]
+            if mask & bit:
+                mask ^= bit
+                candidates[peer] = mask
+                if not mask:
+                    return False
+                if not mask & (mask - 1):
+                    queue.append((peer, mask))
+            elif values[peer] == bit:
+                return False
+    return True
+
+
+def _eliminate(state, i, bit):
+    # Removes a candidate, placing the cell if only one is left
+    candidates = state[1]
+    mask = candidates[i] & ~bit
+    candidates[i] = mask
+    if not mask:
+        return False
+    if not mask & (mask - 1):
+        return _assign(state, i, mask)
+    return True
+
+
+def locked_eliminations(candidates, geo):
+    # Yields (cell, bit, segment) for every candidate locked candidates rules
+    # out: a digit confined to one segment of a box can't be in the rest of
+    # that line, and one confined to one segment of a line can't be in the
+    # rest of that box. candidates is read as it changes, so the caller may
+    # clear each one as it comes.
+    segments = geo.segments
+    masks = []
+    for cells, _, _ in segments:
+        mask = 0
+        for i in cells:
+            mask |= candidates[i]
+        masks.append(mask)
+    for group, rest in geo.segment_groups:
+        once = twice = 0
+        for s in group:
+            mask = masks[s]
+            twice |= once & mask
+            once |= mask
+        confined = once & ~twice
+        while confined:
+            bit = confined & -confined
+            confined ^= bit
+            for s in group:
+                if masks[s] & bit:
+                    break
+            for i in segments[s][rest]:
+                if candidates[i] & bit:
+                    yield i, bit, s
+
+
+def _locked_candidates(state):
+    # Applies locked_eliminations. Returns whether anything was eliminated,
+    # None on a contradiction.
+    changed = False
+    for i, bit, _ in locked_eliminations(state[1], state[2]):
+        if not _eliminate(state, i, bit):
+            return None
+        changed = True
+    return changed
+
+
+def _propagate(state):
+    # Places every single (naked ones are found by _assign) and applies
+    # locked candidates until nothing changes. Returns None on a
+    # contradiction, -1 when the grid is full, else the empty cell with the
+    # fewest candidates.
+    values, candidates, geo = state
+    all_digits = geo.all_digits
+    progress = True
+    while progress:
+        progress = False
+        for unit in geo.units:
+            once = twice = placed = 0
+            for i in unit:
+                mask = candidates[i]
+                twice |= once & mask
+                once |= mask
+                placed |= values[i]
+            if once | placed != all_digits:
+                return None
+            single = once & ~twice & ~placed
+            while single:
+                bit = single & -single
+                single ^= bit
+                for i in unit:
+                    if candidates[i] & bit:
+                        if not _assign(state, i, bit):
+                            return None
+                        progress = True
+                        break
+        if not progress:
+            progress = _locked_candidates(state)
+            if progress is None:
+                return None
+    return _choose(state)
+
+
+def _choose(state):
+    # Among the empty cells with the fewest candidates, the one whose
+    # candidates are shared by the most peers: both of its branches then
+    # prune the most. Returns -1 when the grid is full.
+    candidates, geo = state[1], state[2]
+    best_count = geo.size + 1
+    tied = []
+    for i in range(geo.cells):
+        mask = candidates[i]
+        if mask:
+            count = mask.bit_count()
+            if count < best_count:
+                best_count = count
+                tied = [i]
+            elif count == best_count:
+                tied.append(i)
+    if len(tied) < 2:
+        return tied[0] if tied else -1
+    peers = geo.peers
+    best, best_weight = -1, -1
+    for i in tied:
+        mask = candidates[i]
+        weight = 0
+        for peer in peers[i]:
+            if candidates[peer] & mask:
+                weight += 1
+        if weight > best_weight:
+            best, best_weight = i, weight
+    return best
+
+
+def _search(state, limit, solutions):
+    cell = _propagate(state)
+    if cell is None:
+        return
+    if cell == -1:
+        solutions.append(state[0])
+        return
+    values, candidates, geo = state
+    mask = candidates[cell]
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        child = [values[:], candidates[:], geo]
+        if _assign(child, cell, bit):
+            _search(child, limit, solutions)
+            if len(solutions) >= limit:
+                return
+
+
+def _rule_search(engine, domains, changed, limit, solutions):
+    # The same search over domains (a placed digit is a single bit) with the
+    # rule engine doing all the propagation
+    if not engine.propagate(domains, changed):
+        return
+    cell, best_count = -1, len(domains)
+    for i, mask in enumerate(domains):
+        if mask & (mask - 1):
+            count = mask.bit_count()
+            if count < best_count:
+                cell, best_count = i, count
+                if count == 2:
+                    break
+    if cell == -1:
+        solutions.append(domains)
+        return
+    mask = domains[cell]
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        child = domains[:]
+        child[cell] = bit
+        _rule_search(engine, child, (cell,), limit, solutions)
+        if len(solutions) >= limit:
+            return
+
+
+def _solutions(board, limit, rules):
+    # Up to limit solutions, each a list of digit bits in row-major order
+    if rules:
+        geo = geometry(box_size(len(board)))
+        engine = Engine(geo.cells, classic(geo.box) + list(rules))
+        domains = [1 << (digit - 1) if digit else geo.all_digits for row in board for digit in row]
+        solutions = []
+        _rule_search(engine, domains, None, limit, solutions)
+        return solutions
+    state = _setup(board)
+    if state is None:
+        return []
+    solutions = []
+    _search(state, limit, solutions)
+    return solutions
+
+
+def solve(board, rules=()):
+    # Returns a solved copy of board (N lists of N ints, 0 = empty) or None.
+    # rules are sudoku_rules objects to obey on top of the classic ones.
+    solutions = _solutions(board, 1, rules)
+    if not solutions:
+        return None
+    n = len(board)
+    digits = [bit.bit_length() for bit in solutions[0]]
+    return [digits[r * n:r * n + n] for r in range(n)]
+
+
+def count_solutions(board, limit=2, rules=()):
+    # Counts solutions, stopping once limit is reached
+    return len(_solutions(board, limit, rules))
+
+
+def parse(line):
+    # N * N characters, '0' or '.' for blanks and letters for digits above 9
+    line = line.strip()
+    n = isqrt(len(line))
+    cells = [0 if ch in '0.' else symbols.index(ch.upper()) + 1 for ch in line]
+    return [cells[r * n:r * n + n] for r in range(n)]
+
+
+def format_board(board, blank='0'):
+    return ''.join(symbols[digit - 1] if digit else blank for row in board for digit in row)
@@ -1,5 +1,11 @@
+import os
 import pygame
 import random
+import sys
+import time
+
+from tetris_core import Board, Piece, TetrisEngine, find_placements, columns, rows, empty, S, Z, I, O, J, L, T, shapes, shape_colors
+from tetris_replay import Player, Recorder, Replay
 
 # Initialize Pygame
 pygame.init()
@@ -15,157 +21,142 @@ block_size = 30
 top_left_x = (s_width - play_width) // 2
 top_left_y = s_height - play_height - 50
 
-# Shape formats
-S = [['.....',
-      '.....',
-      '..00.',
-      '.00..',
-      '.....'],
-     ['.....',
-      '..0..',
-      '..00.',
-      '...0.',
-      '.....']]
-
-Z = [['.....',
-      '.....',
-      '.00..',
-      '..00.',
-      '.....'],
-     ['.....',
-      '..0..',
-      '.00..',
-      '.0...',
-      '.....']]
-
-I = [['..0..',
-      '..0..',
-      '..0..',
-      '..0..',
-      '.....'],
-     ['.....',
-      '0000.',
-      '.....',
-      '.....',
-      '.....']]
-
-O = [['.....',
-      '.....',
-      '.00..',
-      '.00..',
-      '.....']]
-
-J = [['.....',
-      '.0...',
-      '.000.',
-      '.....',
-      '.....'],
-     ['.....',
-      '..00.',
-      '..0..',
-      '..0..',
-      '.....'],
-     ['.....',
-      '.....',
-      '.000.',
-      '...0.',
-      '.....'],
-     ['.....',
-      '..0..',
-      '..0..',
-      '.00..',
-      '.....']]
-
-L = [['.....',
-      '...0.',
-      '.000.',
-      '.....',
-      '.....'],
-     ['.....',
-      '..0..',
-      '..0..',
-      '..00.',
-      '.....'],
-     ['.....',
-      '.....',
-      '.000.',
-      '.0...',
-      '.....'],
-     ['.....',
-      '.00..',
-      '..0..',
-      '..0..',
-      '.....']]
-
-T = [['.....',
-      '..0..',
-      '.000.',
-      '.....',
-      '.....'],
-     ['.....',
-      '..0..',
-      '..00.',
-      '..0..',
-      '.....'],
-     ['.....',
-      '.....',
-      '.000.',
-      '..0..',
-      '.....'],
-     ['.....',
-      '..0..',
-      '.00..',
-      '..0..',
-      '.....']]
-
-# List of shapes and their colors
-shapes = [S, Z, I, O, J, L, T]
-shape_colors = [
-    (0, 255, 0),     # Green
-    (255, 0, 0),     # Red
-    (0, 255, 255),   # Cyan
-    (255, 255, 0),   # Yellow
-    (255, 165, 0),   # Orange
-    (0, 0, 255),     # Blue
-    (128, 0, 128)    # Purple
-]
-
-class Piece:
-    def __init__(self, column, row, shape):
-        self.x = column
-        self.y = row
-        self.shape = shape
-        self.color = shape_colors[shapes.index(shape)]
-        self.rotation = 0
+# Arrow keys mapped to engine inputs
+key_actions = {
+    pygame.K_LEFT: 'left',
+    pygame.K_RIGHT: 'right',
+    pygame.K_DOWN: 'down',
+    pygame.K_UP: 'rotate',
+}
+
+# Timing, all in logic ticks except the rates
+logic_rate = 60        # logic ticks per second
+render_cap = 60        # frames drawn per second at most (0 = every loop)
+gravity_ticks = 16     # ~0.27s per row at 60 ticks/s
+lock_delay_ticks = 0   # extra ticks a landed piece can still slide
+das_ticks = 10         # delay before a held key starts repeating
+arr_ticks = 2          # ticks between repeats once it does
+low_latency_input = True   # inputs before gravity, wake on input, draw at once
+repeating_actions = ('left', 'right', 'down')
+
+class FixedTimestep:
+    # Hands out logic ticks at a fixed rate from the wall clock, caps the
+    # render rate and sleeps until whichever is due next.
+    def __init__(self, rate=logic_rate, render_rate=render_cap, max_catch_up=5):
+        self.interval = 1 / rate
+        self.render_interval = 1 / render_rate if render_rate else 0
+        self.max_catch_up = max_catch_up
+        self.last = time.perf_counter()
+        self.accumulator = 0.0
+        self.next_render = self.last
+
+    def ticks_due(self):
+        now = time.perf_counter()
+        self.accumulator += now - self.last
+        self.last = now
+        ticks = int(self.accumulator / self.interval)
+        self.accumulator -= ticks * self.interval
+        # After a long stall drop the backlog instead of fast-forwarding
+        return min(ticks, self.max_catch_up)
+
+    def render_due(self):
+        now = time.perf_counter()
+        if now < self.next_render:
+            return False
+        self.next_render = max(self.next_render + self.render_interval, now)
+        return True
+
+    def time_left(self):
+        # Seconds until the next logic tick or frame is due
+        next_tick = self.last + self.interval - self.accumulator
+        wake = min(next_tick, self.next_render) if self.render_interval else next_tick
+        return max(0.0, wake - time.perf_counter())
+
+    def sleep(self):
+        wait = self.time_left()
+        if wait:
+            time.sleep(wait)
+
+    def wait_for_input(self):
+        # Like sleep(), but returns as soon as an event arrives, returning it
+        # (else None). The caller handles it before the rest of the queue:
+        # posting it back would put it behind events that came after it.
+        wait_ms = int(self.time_left() * 1000)
+        if wait_ms:
+            event = pygame.event.wait(wait_ms)
+            if event.type != pygame.NOEVENT:
+                return event
+        return None
+
+class LatencyProbe:
+    # Input-to-photon latency, up to the display update that first shows an
+    # input's effect. pygame events carry no timestamp, so each KEYDOWN is
+    # bounded by when it was dequeued and by the previous poll, which adds
+    # the worst case time it may have sat in the queue.
+    def __init__(self):
+        self.last_poll = time.perf_counter()
+        self.pending = []
+        self.samples = []   # (from dequeue, from previous poll)
+
+    def poll(self):
+        # Call right after draining the event queue
+        self.last_poll = time.perf_counter()
+
+    def moved(self, dequeued):
+        self.pending.append((dequeued, self.last_poll))
+
+    def presented(self):
+        now = time.perf_counter()
+        self.samples.extend((now - dequeued, now - polled) for dequeued, polled in self.pending)
+        self.pending.clear()
+
+    def percentile(self, p, worst_case=False):
+        ordered = sorted(sample[worst_case] for sample in self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def report(self):
+        if not self.samples:
+            return 'input latency: no samples'
+        return (f'input latency over {len(self.samples)} inputs: '
+                f'p50 {self.percentile(50) * 1000:.1f} ms, p99 {self.percentile(99) * 1000:.1f} ms '
+                f'(with queue wait at most p50 {self.percentile(50, True) * 1000:.1f} ms, '
+                f'p99 {self.percentile(99, True) * 1000:.1f} ms)')
+
+class KeyRepeat:
+    # DAS/ARR for held keys, counted in logic ticks
+    def __init__(self, delay=das_ticks, interval=arr_ticks):
+        self.delay = delay
+        self.interval = interval
+        self.held = {}   # action -> ticks held
+
+    def press(self, action):
+        if action in repeating_actions:
+            self.held[action] = 0
+        return action
+
+    def release(self, action):
+        self.held.pop(action, None)
+
+    def tick(self):
+        repeats = []
+        for action, held in self.held.items():
+            held += 1
+            self.held[action] = held
+            if held >= self.delay and (held - self.delay) % self.interval == 0:
+                repeats.append(action)
+        return repeats
 
 def create_grid(locked_positions={}):
-    grid = [[(0,0,0) for _ in range(10)] for _ in range(20)]
-    for y in range(len(grid)):
-        for x in range(len(grid[y])):
-            if (x, y) in locked_positions:
-                grid[y][x] = locked_positions[(x, y)]
-    return grid
+    return Board.from_locked(locked_positions).colors
 
 def convert_shape_format(shape):
-    positions = []
-    format_shape = shape.shape[shape.rotation % len(shape.shape)]
-    for i, line in enumerate(format_shape):
-        row = list(line)
-        for j, char in enumerate(row):
-            if char == '0':
-                positions.append((shape.x + j - 2, shape.y + i - 4))
-    return positions
+    return shape.cells()
 
 def valid_space(shape, grid):
-    accepted_positions = [
-        [(x, y) for x in range(10) if grid[y][x] == (0,0,0)] for y in range(20)
-    ]
-    accepted_positions = [pos for sublist in accepted_positions for pos in sublist]
-    formatted = convert_shape_format(shape)
-    for pos in formatted:
-        if pos not in accepted_positions and pos[1] > -1:
-            return False
-    return True
+    # Accepts either a Board or a 20x10 colour grid
+    if not isinstance(grid, Board):
+        grid = Board.from_grid(grid)
+    return grid.fits_piece(shape)
 
 def check_lost(positions):
     for pos in positions:
@@ -175,10 +166,19 @@ def check_lost(positions):
     return False
 
 def get_shape():
-    return Piece(5, 0, random.choice(shapes))
+    return Piece(5, 0, random.randrange(len(shapes)))
+
+_fonts = {}
+
+def get_font(size, bold=False):
+    # SysFont scans the system font list, so build each size only once
+    key = (size, bold)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.SysFont('comicsans', size, bold=bold)
+    return _fonts[key]
 
 def draw_text_middle(surface, text, size, color):
-    font = pygame.font.SysFont('comicsans', size, bold=True)
+    font = get_font(size, bold=True)
     label = font.render(text, True, color)
     surface.blit(
         label, 
@@ -201,39 +201,24 @@ def draw_grid(surface, grid):
             )
 
 def clear_rows(grid, locked_positions):
-    inc = 0
-    for y in range(len(grid)-1, -1, -1):
-        row = grid[y]
-        if (0,0,0) not in row:
-            inc += 1
-            ind = y
-            for x in range(len(row)):
-                try:
-                    del locked_positions[(x, y)]
-                except:
-                    continue
+    board = Board.from_locked(locked_positions)
+    inc = board.clear_rows()
     if inc > 0:
-        for key in sorted(list(locked_positions), key=lambda k: k[1])[::-1]:
-            x, y = key
-            if y < ind:
-                new_key = (x, y + inc)
-                locked_positions[new_key] = locked_positions.pop(key)
+        locked_positions.clear()
+        locked_positions.update(board.to_locked())
     return inc
 
 def draw_next_shape(shape, surface):
-    font = pygame.font.SysFont('comicsans', 30)
+    font = get_font(30)
     label = font.render('Next Shape:', True, (255,255,255))
     start_x = top_left_x + play_width + 50
     start_y = top_left_y + play_height // 2 - 100
-    format_shape = shape.shape[shape.rotation % len(shape.shape)]
-    for i, line in enumerate(format_shape):
-        row = list(line)
-        for j, char in enumerate(row):
-            if char == '0':
-                pygame.draw.rect(
-                    surface, shape.color,
-                    (start_x + j * block_size, start_y + i * block_size, block_size, block_size)
-                )
+    offsets = shape.shape.offsets[shape.rotation % shape.shape.rotations]
+    for dx, dy in offsets:
+        pygame.draw.rect(
+            surface, shape.color,
+            (start_x + (dx + 2) * block_size, start_y + (dy + 4) * block_size, block_size, block_size)
+        )
     surface.blit(label, (start_x + 10, start_y - 30))
 
 def update_score(new_score):
@@ -252,27 +237,30 @@ def max_score():
     except:
         return '0'
 
-def draw_window(surface, grid, score=0, high_score=0):
+def draw_window(surface, grid, score=0, high_score=0, piece=None):
     surface.fill((0,0,0))
     # Title
-    font = pygame.font.SysFont('comicsans', 60)
+    font = get_font(60)
     label = font.render('Tetris', True, (255,255,255))
     surface.blit(
         label, 
         (top_left_x + play_width // 2 - label.get_width() // 2, 30)
     )
     # Current score
-    font = pygame.font.SysFont('comicsans', 30)
+    font = get_font(30)
     label = font.render(f'Score: {score}', True, (255,255,255))
     surface.blit(label, (top_left_x - 200, top_left_y + 200))
     # High score
     label = font.render(f'High Score: {high_score}', True, (255,255,255))
     surface.blit(label, (top_left_x - 200, top_left_y + 240))
-    # Draw grid and border
+    # Draw grid and border, with the falling piece on top of the locked cells
+    overlay = {}
+    if piece is not None:
+        overlay = dict.fromkeys(convert_shape_format(piece), piece.color)
     for y in range(len(grid)):
         for x in range(len(grid[y])):
             pygame.draw.rect(
-                surface, grid[y][x],
+                surface, overlay.get((x, y), grid[y][x]),
                 (top_left_x + x * block_size, top_left_y + y * block_size, block_size, block_size)
             )
     pygame.draw.rect(
@@ -281,87 +269,203 @@ def draw_window(surface, grid, score=0, high_score=0):
     )
     draw_grid(surface, grid)
 
-def main():
-    global grid
-    locked_positions = {}
-    grid = create_grid(locked_positions)
-    change_piece = False
+class Renderer:
+    # Draws the game incrementally: a pre-baked background holds everything
+    # static, cells come from one sprite per colour and only cells, labels
+    # and the preview that changed are redrawn and passed to display.update.
+    def __init__(self, surface):
+        self.surface = surface
+        self.preview = (top_left_x + play_width + 50, top_left_y + play_height // 2 - 100)
+        # Border and grid lines, re-applied on top of every redrawn cell
+        # (one pixel larger than the field: the lines overshoot by one pixel)
+        self.overlay = pygame.Surface((play_width + 1, play_height + 1), pygame.SRCALPHA)
+        pygame.draw.rect(self.overlay, (255,0,0), (0, 0, play_width, play_height), 5)
+        for y in range(rows):
+            pygame.draw.line(self.overlay, (128,128,128), (0, y * block_size), (play_width, y * block_size))
+        for x in range(columns):
+            pygame.draw.line(self.overlay, (128,128,128), (x * block_size, 0), (x * block_size, play_height))
+        self.background = pygame.Surface(surface.get_size())
+        self.background.fill((0,0,0))
+        label = get_font(60).render('Tetris', True, (255,255,255))
+        self.background.blit(label, (top_left_x + play_width // 2 - label.get_width() // 2, 30))
+        label = get_font(30).render('Next Shape:', True, (255,255,255))
+        self.background.blit(label, (self.preview[0] + 10, self.preview[1] - 30))
+        # Empty cells are drawn over the title, as draw_window does
+        self.background.fill(empty, (top_left_x, top_left_y, play_width, play_height))
+        self.background.blit(self.overlay, (top_left_x, top_left_y))
+        self.sprites = {}
+        self.invalidate()
+
+    def invalidate(self):
+        # Forces a full redraw on the next frame
+        self.shown = None
+        self.labels = {}
+        self.next_kind = None
+
+    def sprite(self, color):
+        cell = self.sprites.get(color)
+        if cell is None:
+            cell = pygame.Surface((block_size, block_size))
+            cell.fill(color)
+            self.sprites[color] = cell
+        return cell
+
+    def draw(self, board, piece, next_piece, score, high_score):
+        dirty = []
+        if self.shown is None:
+            self.surface.blit(self.background, (0, 0))
+            self.shown = [[empty] * columns for _ in range(rows)]
+            dirty.append(self.surface.get_rect())
+        overlay = dict.fromkeys(piece.cells(), piece.color)
+        for y, row in enumerate(board.colors):
+            shown = self.shown[y]
+            for x, color in enumerate(row):
+                color = overlay.get((x, y), color)
+                if shown[x] != color:
+                    shown[x] = color
+                    rect = pygame.Rect(top_left_x + x * block_size, top_left_y + y * block_size,
+                                       block_size, block_size)
+                    self.surface.blit(self.sprite(color), rect)
+                    self.surface.blit(self.overlay, rect, (x * block_size, y * block_size, block_size, block_size))
+                    dirty.append(rect)
+        self.draw_label('score', f'Score: {score}', (top_left_x - 200, top_left_y + 200), dirty)
+        self.draw_label('high', f'High Score: {high_score}', (top_left_x - 200, top_left_y + 240), dirty)
+        if next_piece.kind != self.next_kind:
+            self.next_kind = next_piece.kind
+            area = pygame.Rect(self.preview, (5 * block_size, 5 * block_size))
+            self.surface.blit(self.background, area, area)
+            for dx, dy in next_piece.shape.offsets[next_piece.rotation % next_piece.shape.rotations]:
+                self.surface.blit(self.sprite(next_piece.color),
+                                  (area.x + (dx + 2) * block_size, area.y + (dy + 4) * block_size))
+            dirty.append(area)
+        if dirty:
+            pygame.display.update(dirty)
+
+    def draw_label(self, key, text, pos, dirty):
+        # Labels are only re-rendered when their text changes
+        old = self.labels.get(key)
+        if old is not None and old[0] == text:
+            return
+        if old is not None:
+            self.surface.blit(self.background, old[1], old[1])
+            dirty.append(old[1])
+        label = get_font(30).render(text, True, (255,255,255))
+        rect = self.surface.blit(label, pos)
+        self.labels[key] = (text, rect)
+        dirty.append(rect)
+
+def main(low_latency=low_latency_input):
+    engine = TetrisEngine(random.randrange(2 ** 32), gravity_ticks, lock_delay_ticks)
+    recorder = Recorder(engine)
+    timer = FixedTimestep()
+    keys = KeyRepeat()
+    renderer = Renderer(win)
+    probe = LatencyProbe()
     run_game = True
-    current_piece = get_shape()
-    next_piece = get_shape()
-    clock = pygame.time.Clock()
-    fall_time = 0
-    fall_speed = 0.27
-    score = 0
     high_score = int(max_score())
+    woken = None   # the event that ended the last wait, handled first
     while run_game:
-        grid = create_grid(locked_positions)
-        fall_time += clock.get_rawtime()
-        clock.tick()
-        # Piece falling mechanism
-        if fall_time / 1000 > fall_speed:
-            fall_time = 0
-            current_piece.y += 1
-            if not(valid_space(current_piece, grid)) and current_piece.y > 0:
-                current_piece.y -= 1
-                change_piece = True
+        if not low_latency:
+            # Legacy order: gravity before the inputs queued during the last frame
+            advance(engine, recorder, keys, timer.ticks_due())
         # Event handling
-        for event in pygame.event.get():
+        moved = False
+        events = pygame.event.get()
+        if woken is not None:
+            events.insert(0, woken)
+            woken = None
+        for event in events:
             if event.type == pygame.QUIT:
                 run_game = False
                 pygame.display.quit()
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    current_piece.x -= 1
-                    if not(valid_space(current_piece, grid)):
-                        current_piece.x += 1
-                elif event.key == pygame.K_RIGHT:
-                    current_piece.x += 1
-                    if not(valid_space(current_piece, grid)):
-                        current_piece.x -= 1
-                elif event.key == pygame.K_DOWN:
-                    current_piece.y += 1
-                    if not(valid_space(current_piece, grid)):
-                        current_piece.y -= 1
-                elif event.key == pygame.K_UP:
-                    current_piece.rotation += 1
-                    if not(valid_space(current_piece, grid)):
-                        current_piece.rotation -= 1
-        shape_pos = convert_shape_format(current_piece)
-        # Add piece to the grid
-        for x, y in shape_pos:
-            if y > -1:
-                grid[y][x] = current_piece.color
-        # Piece has landed
-        if change_piece:
-            for pos in shape_pos:
-                p = (pos[0], pos[1])
-                locked_positions[p] = current_piece.color
-            current_piece = next_piece
-            next_piece = get_shape()
-            change_piece = False
-            # Clear rows and update score
-            cleared_rows = clear_rows(grid, locked_positions)
-            if cleared_rows:
-                score += cleared_rows * 10
-        draw_window(win, grid, score, high_score)
-        draw_next_shape(next_piece, win)
-        pygame.display.update()
+                stamp = time.perf_counter()
+                if recorder.apply(keys.press(key_actions.get(event.key))):
+                    probe.moved(stamp)
+                    moved = True
+            if event.type == pygame.KEYUP:
+                keys.release(key_actions.get(event.key))
+        probe.poll()
+        if not run_game:
+            break
+        if low_latency:
+            advance(engine, recorder, keys, timer.ticks_due())
+        # A moved piece is drawn straight away in low-latency mode
+        if timer.render_due() or (low_latency and moved):
+            renderer.draw(engine.board, engine.current, engine.next, engine.score, high_score)
+            probe.presented()
         # Check for game over
-        if check_lost(locked_positions):
+        if engine.game_over:
             draw_text_middle(win, 'You Lost!', 80, (255,255,255))
             pygame.display.update()
             pygame.time.delay(2000)
             run_game = False
-            update_score(score)
+            update_score(engine.score)
+            save_replay(recorder.finish())
+        if low_latency:
+            woken = timer.wait_for_input()
+            if woken is not None:
+                # Woken by the event itself, so it cannot have waited longer
+                probe.poll()
+        else:
+            timer.sleep()
+    print(probe.report())
     pygame.display.quit()
 
+def advance(engine, recorder, keys, ticks):
+    # Logic runs in fixed ticks, independent of how fast we draw
+    for _ in range(ticks):
+        for action in keys.tick():
+            recorder.apply(action)
+        engine.tick(1)
+
+def save_replay(replay):
+    # Replays sit next to scores.txt so high scores can be re-verified
+    os.makedirs('replays', exist_ok=True)
+    path = os.path.join('replays', f"{time.strftime('%Y%m%d-%H%M%S')}-{replay.score}.trpl")
+    replay.save(path)
+    return path
+
+def watch_replay(path, speed=1):
+    # Plays a recording at 1x/2x/8x (keys 1, 2, 8); LEFT/RIGHT seek 10 seconds
+    global win
+    win = pygame.display.set_mode((s_width, s_height))
+    pygame.display.set_caption('Tetris replay')
+    replay = Replay.load(path)
+    player = Player(replay)
+    renderer = Renderer(win)
+    timer = FixedTimestep(logic_rate * speed, max_catch_up=5 * speed)
+    speed_keys = {pygame.K_1: 1, pygame.K_2: 2, pygame.K_8: 8}
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key in speed_keys:
+                    speed = speed_keys[event.key]
+                    timer = FixedTimestep(logic_rate * speed, max_catch_up=5 * speed)
+                elif event.key == pygame.K_LEFT:
+                    player.seek(player.frame - 10 * logic_rate)
+                elif event.key == pygame.K_RIGHT:
+                    player.seek(player.frame + 10 * logic_rate)
+        ticks = timer.ticks_due()
+        if ticks and player.advance(ticks) is None:
+            running = False
+        if timer.render_due():
+            engine = player.engine
+            renderer.draw(engine.board, engine.current, engine.next, engine.score, replay.score)
+        timer.sleep()
+    pygame.quit()
+
 def main_menu():
     global win
     win = pygame.display.set_mode((s_width, s_height))
     pygame.display.set_caption('Tetris')
+    clock = pygame.time.Clock()
     run = True
     while run:
+        clock.tick(30)
         win.fill((0,0,0))
         draw_text_middle(win, 'Press Any Key To Play', 60, (255,255,255))
         pygame.display.update()
@@ -374,4 +478,8 @@ def main_menu():
     pygame.quit()
 
 if __name__ == '__main__':
-    main_menu()
+    # python tetris.py [replay file [speed]]
+    if len(sys.argv) > 1:
+        watch_replay(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)
+    else:
+        main_menu()
@@ -0,0 +1,140 @@
+import numpy as np
+
+from tetris_core import columns, rows, moves, actions, shape_registry
+
+# Tetris for N boards at once. Every playfield is a slice of one
+# (N, rows, columns) uint8 array (0 = empty, kind + 1 = locked cell) and the
+# falling pieces live in parallel arrays, so one call steps the whole batch.
+# Rules match tetris_core.TetrisEngine; only the piece RNG differs.
+
+# Action codes: 0 is "no input", then the engine's actions in order
+action_codes = {action: code for code, action in enumerate(actions, 1)}
+_nudges = np.array([(0, 0, 0)] + [moves[action] for action in actions], dtype=np.int64)
+
+# (kind, rotation, cell, dx/dy) with rotations padded to 4 by wrapping
+_offsets = np.array([
+    [shape.offsets[rotation % shape.rotations] for rotation in range(4)]
+    for shape in shape_registry
+], dtype=np.int64)
+_rotations = np.array([shape.rotations for shape in shape_registry], dtype=np.int64)
+
+
+class BatchTetris:
+    def __init__(self, n, seed=None, gravity=16, auto_reset=False):
+        self.n = n
+        self.gravity = gravity
+        self.auto_reset = auto_reset
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, rows, columns), dtype=np.uint8)
+        self.kind = np.zeros(n, dtype=np.int64)
+        self.next_kind = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.rotation = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.frame = 0
+        self.reset()
+
+    def reset(self, mask=None):
+        idx = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+        self.boards[idx] = 0
+        self.next_kind[idx] = self.rng.integers(0, len(shape_registry), len(idx))
+        self.spawn(idx)
+        self.score[idx] = 0
+        self.lines[idx] = 0
+        self.done[idx] = False
+
+    def spawn(self, idx):
+        self.kind[idx] = self.next_kind[idx]
+        self.next_kind[idx] = self.rng.integers(0, len(shape_registry), len(idx))
+        self.x[idx] = 5
+        self.y[idx] = 0
+        self.rotation[idx] = 0
+
+    def cells(self, idx, x, y, rotation):
+        # (k, 4) column and row arrays for the pieces of boards idx
+        offsets = _offsets[self.kind[idx], rotation]
+        return x[:, None] + offsets[..., 0], y[:, None] + offsets[..., 1]
+
+    def fits(self, idx, x, y, rotation):
+        xs, ys = self.cells(idx, x, y, rotation)
+        inside = (xs >= 0) & (xs < columns) & (ys < rows)
+        occupied = self.boards[
+            idx[:, None], ys.clip(0, rows - 1), xs.clip(0, columns - 1)
+        ] != 0
+        # Cells above the top edge are always free, as in Board.fits
+        return ((ys < 0) | (inside & ~occupied)).all(axis=1)
+
+    def step(self, codes):
+        # codes: one action code per board. Returns (rows cleared, finished)
+        codes = np.broadcast_to(np.asarray(codes, dtype=np.int64), (self.n,))
+        idx = np.flatnonzero((codes != 0) & ~self.done)
+        if len(idx):
+            nudge = _nudges[codes[idx]]
+            x = self.x[idx] + nudge[:, 0]
+            y = self.y[idx] + nudge[:, 1]
+            rotation = (self.rotation[idx] + nudge[:, 2]) % _rotations[self.kind[idx]]
+            ok = self.fits(idx, x, y, rotation)
+            moved = idx[ok]
+            self.x[moved] = x[ok]
+            self.y[moved] = y[ok]
+            self.rotation[moved] = rotation[ok]
+        return self.tick(1)
+
+    def tick(self, n_frames=1):
+        cleared = np.zeros(self.n, dtype=np.int64)
+        finished = np.zeros(self.n, dtype=bool)
+        # Only frames that land on a gravity step do any work
+        falls = (self.frame + n_frames) // self.gravity - self.frame // self.gravity
+        self.frame += n_frames
+        for _ in range(falls):
+            step_cleared, step_finished = self.fall()
+            cleared += step_cleared
+            finished |= step_finished
+        if self.auto_reset and finished.any():
+            self.reset(finished)
+        return cleared, finished
+
+    def fall(self):
+        cleared = np.zeros(self.n, dtype=np.int64)
+        finished = np.zeros(self.n, dtype=bool)
+        idx = np.flatnonzero(~self.done)
+        if not len(idx):
+            return cleared, finished
+        y = self.y[idx] + 1
+        ok = self.fits(idx, self.x[idx], y, self.rotation[idx])
+        self.y[idx[ok]] = y[ok]
+        landed = idx[~ok]
+        if len(landed):
+            cleared[landed], finished[landed] = self.lock(landed)
+        return cleared, finished
+
+    def lock(self, idx):
+        xs, ys = self.cells(idx, self.x[idx], self.y[idx], self.rotation[idx])
+        visible = ys >= 0
+        owner = np.broadcast_to(idx[:, None], xs.shape)
+        self.boards[owner[visible], ys[visible], xs[visible]] = (
+            np.broadcast_to(self.kind[idx, None], xs.shape)[visible] + 1)
+        cleared = self.clear_rows(idx)
+        self.lines[idx] += cleared
+        self.score[idx] += cleared * 10
+        self.spawn(idx)
+        lost = ~visible.all(axis=1) | (self.boards[idx, 0] != 0).any(axis=1)
+        self.done[idx] |= lost
+        return cleared, lost
+
+    def clear_rows(self, idx):
+        boards = self.boards[idx]
+        full = (boards != 0).all(axis=2)
+        counts = full.sum(axis=1)
+        hit = np.flatnonzero(counts)
+        if len(hit):
+            # Stable sort puts the full rows first and keeps the others in
+            # order; blanking the first `count` rows then drops the board
+            order = np.argsort(~full[hit], axis=1, kind='stable')
+            compacted = np.take_along_axis(boards[hit], order[:, :, None], axis=1)
+            compacted[np.arange(rows)[None, :] < counts[hit, None]] = 0
+            self.boards[idx[hit]] = compacted
+        return counts
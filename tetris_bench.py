@@ -0,0 +1,46 @@
+import random
+import sys
+import time
+
+from tetris_core import TetrisEngine, Piece, actions, find_placements
+
+# Benchmarks for the headless Tetris code: python tetris_bench.py [boards]
+
+
+def sample_boards(count, seed=0):
+    # Mid-game boards collected from random play, one per locked piece
+    rng = random.Random(seed)
+    boards = []
+    game = 0
+    while len(boards) < count:
+        engine = TetrisEngine(seed=game)
+        game += 1
+        while not engine.game_over and len(boards) < count:
+            if engine.step(rng.choice(actions + (None,) * 4)):
+                boards.append(list(engine.board.rows))
+    return boards
+
+
+def bench_placements(boards, with_paths=False):
+    pieces = [Piece(5, 0, kind) for kind in range(7)]
+    found = 0
+    start = time.perf_counter()
+    for masks in boards:
+        for piece in pieces:
+            placements = find_placements(masks, piece)
+            found += len(placements)
+            if with_paths:
+                for placement in placements:
+                    placement.path
+    elapsed = time.perf_counter() - start
+    searches = len(boards) * len(pieces)
+    label = 'placements + paths' if with_paths else 'placements'
+    print(f'{label}: {searches} searches, {found} placements in {elapsed:.3f}s')
+    print(f'  {found / elapsed:,.0f} placements/s, {elapsed / searches * 1e6:.1f} us/search')
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    boards = sample_boards(count)
+    bench_placements(boards)
+    bench_placements(boards[:count // 10], with_paths=True)
@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from tetris_core import TetrisEngine, PlacementSearch, columns, rows, full_row, shape_registry
+
+# Expectimax autoplayer. The current and next pieces are searched exactly,
+# deeper plies average over all seven shapes. Root moves are scored in
+# parallel worker processes, each with its own LRU transposition table.
+
+# Heuristic weights (aggregate height, holes, bumpiness, cleared lines)
+weights = {'height': -0.51, 'holes': -0.36, 'bumpiness': -0.18, 'lines': 0.76}
+topped_out = -1e9
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    # LRU map from a position to (depth searched, value)
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def get(self, key, depth):
+        # The stored value if it was searched at least depth plies, else None
+        self.lookups += 1
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, depth, value):
+        self.entries[key] = (depth, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+def evaluate(masks):
+    heights = [0] * columns
+    holes = 0
+    covered = 0
+    for y, mask in enumerate(masks):
+        # Empty cells under a block in the same column are holes
+        holes += (covered & ~mask).bit_count()
+        new = mask & ~covered
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = rows - y
+            new ^= low
+        covered |= mask
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return (weights['height'] * sum(heights) + weights['holes'] * holes
+            + weights['bumpiness'] * bumpiness)
+
+
+def drop(masks, kind, rotation, x, y):
+    # Lock a piece into a tuple of row masks: (new masks, lines) or None on top-out
+    shape = shape_registry[kind]
+    min_dx, _, min_dy, _ = shape.extents[rotation]
+    top = y + min_dy
+    if top < 0:
+        return None
+    board = list(masks)
+    for row, bits in enumerate(shape.row_masks[rotation], top):
+        board[row] |= bits << (x + min_dx)
+    kept = [mask for mask in board if mask != full_row]
+    cleared = rows - len(kept)
+    if cleared:
+        board = [0] * cleared + kept
+    if board[0]:
+        return None
+    return tuple(board), cleared
+
+
+class Searcher:
+    def __init__(self, table, beam=8):
+        self.table = table
+        self.beam = beam
+        self.nodes = 0
+        self.deadline = None
+
+    def children(self, masks, kind):
+        found = []
+        for placement in PlacementSearch(masks, kind).placements():
+            result = drop(masks, kind, placement.rotation, placement.x, placement.y)
+            if result is not None:
+                found.append(result)
+        return found
+
+    def value(self, masks, pieces, depth):
+        # Best achievable score from masks with the known upcoming pieces;
+        # once they run out, the expectation over every shape
+        self.nodes += 1
+        if depth == 0:
+            return evaluate(masks)
+        if pieces:
+            return self.known(masks, pieces, depth)
+        return sum(self.known(masks, (kind,), depth)
+                   for kind in range(len(shape_registry))) / len(shape_registry)
+
+    def known(self, masks, pieces, depth):
+        # value() with pieces known, through the table. Positions are keyed
+        # without the depth, so a deeper result answers a shallower search,
+        # and an expectation's terms are the very entries the next move
+        # looks up once its piece is known. Even so, at max_depth 3 nearly
+        # every position is new and only a percent or two of lookups hit.
+        key = (masks, pieces)
+        cached = self.table.get(key, depth)
+        if cached is not None:
+            return cached
+        result = self.best(masks, pieces[0], pieces[1:], depth)
+        self.table.put(key, depth, result)
+        return result
+
+    def best(self, masks, kind, rest, depth):
+        # Expanding a node costs far more than reading the clock
+        if time.monotonic() > self.deadline:
+            raise SearchTimeout
+        children = self.children(masks, kind)
+        if not children:
+            return topped_out
+        if depth > 1 and len(children) > self.beam:
+            # Only expand the most promising placements below the root
+            children.sort(key=lambda child: evaluate(child[0]) + weights['lines'] * child[1],
+                          reverse=True)
+            children = children[:self.beam]
+        return max(weights['lines'] * cleared + self.value(child, rest, depth - 1)
+                   for child, cleared in children)
+
+
+# Worker-process state, created once per process by the pool initializer
+_searcher = None
+
+
+def _init_worker(table_size, beam):
+    global _searcher
+    _searcher = Searcher(TranspositionTable(table_size), beam)
+
+
+def _score_move(masks, cleared, pieces, depth, deadline):
+    # Returns (value or None on timeout, nodes, hits, lookups) for one root move
+    searcher = _searcher
+    searcher.deadline = deadline
+    nodes, hits, lookups = searcher.nodes, searcher.table.hits, searcher.table.lookups
+    try:
+        value = weights['lines'] * cleared + searcher.value(masks, pieces, depth)
+    except SearchTimeout:
+        value = None
+    return (value, searcher.nodes - nodes, searcher.table.hits - hits,
+            searcher.table.lookups - lookups)
+
+
+class ExpectimaxBot:
+    # choose() runs iterative deepening until time_budget seconds have passed
+    # and returns the placement from the deepest fully searched ply.
+    def __init__(self, time_budget=0.2, max_depth=3, workers=None, table_size=200000, beam=8):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.workers = os.cpu_count() if workers is None else workers
+        self.pool = None
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(table_size, beam))
+        else:
+            _init_worker(table_size, beam)
+        self.nodes = 0
+        self.hits = 0
+        self.lookups = 0
+        self.search_time = 0.0
+        self.depth_reached = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def choose(self, engine):
+        start = time.monotonic()
+        deadline = start + self.time_budget
+        # The greedy fallback below counts as one ply
+        self.depth_reached = 1
+        piece = engine.current
+        search = PlacementSearch(engine.board.rows, piece.kind, piece.x, piece.y, piece.rotation)
+        masks = tuple(engine.board.rows)
+        moves = []
+        for placement in search.placements():
+            result = drop(masks, piece.kind, placement.rotation, placement.x, placement.y)
+            if result is not None:
+                moves.append((placement, result))
+        if not moves:
+            placements = search.placements()
+            return placements[0] if placements else None
+        best = max(moves, key=lambda move: weights['lines'] * move[1][1] + evaluate(move[1][0]))[0]
+        for depth in range(1, self.max_depth):
+            scores = self.score_moves(moves, (engine.next.kind,), depth, deadline)
+            if scores is None:
+                break
+            best = moves[max(range(len(moves)), key=scores.__getitem__)][0]
+            self.depth_reached = depth + 1
+        self.search_time += time.monotonic() - start
+        return best
+
+    def score_moves(self, moves, pieces, depth, deadline):
+        jobs = [(child, cleared, pieces, depth, deadline) for _, (child, cleared) in moves]
+        if self.pool is None:
+            results = [_score_move(*job) for job in jobs]
+        else:
+            futures = [self.pool.submit(_score_move, *job) for job in jobs]
+            wait(futures)
+            results = [future.result() for future in futures]
+        for _, nodes, hits, lookups in results:
+            self.nodes += nodes
+            self.hits += hits
+            self.lookups += lookups
+        scores = [value for value, *_ in results]
+        if None in scores:
+            return None
+        return scores
+
+    def stats(self):
+        return {
+            'nodes': self.nodes,
+            'nodes_per_second': self.nodes / self.search_time if self.search_time else 0.0,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'depth': self.depth_reached,
+        }
+
+
+def play(engine, bot, max_pieces=None):
+    # Drive a headless engine with the bot until game over; returns pieces placed
+    pieces = 0
+    while not engine.game_over and (max_pieces is None or pieces < max_pieces):
+        placement = bot.choose(engine)
+        if placement is not None:
+            for action in placement.path:
+                engine.apply(action)
+        engine.drop()
+        pieces += 1
+    return pieces
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    pieces = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    bot = ExpectimaxBot(time_budget=budget)
+    engine = TetrisEngine(seed=0)
+    placed = play(engine, bot, pieces)
+    bot.close()
+    stats = bot.stats()
+    print(f'{placed} pieces, score {engine.score}, lines {engine.lines}')
+    print(f"{stats['nodes_per_second']:,.0f} nodes/s, cache hit rate {stats['hit_rate']:.1%}, "
+          f"last depth {stats['depth']}")
@@ -0,0 +1,536 @@
+# Game rules shared by the pygame frontend and headless tools (no pygame here)
+import random
+from collections import deque
+
+# Playfield dimensions
+columns = 10
+rows = 20
+full_row = (1 << columns) - 1
+empty = (0, 0, 0)
+
+# Shape formats
+S = [['.....',
+      '.....',
+      '..00.',
+      '.00..',
+      '.....'],
+     ['.....',
+      '..0..',
+      '..00.',
+      '...0.',
+      '.....']]
+
+Z = [['.....',
+      '.....',
+      '.00..',
+      '..00.',
+      '.....'],
+     ['.....',
+      '..0..',
+      '.00..',
+      '.0...',
+      '.....']]
+
+I = [['..0..',
+      '..0..',
+      '..0..',
+      '..0..',
+      '.....'],
+     ['.....',
+      '0000.',
+      '.....',
+      '.....',
+      '.....']]
+
+O = [['.....',
+      '.....',
+      '.00..',
+      '.00..',
+      '.....']]
+
+J = [['.....',
+      '.0...',
+      '.000.',
+      '.....',
+      '.....'],
+     ['.....',
+      '..00.',
+      '..0..',
+      '..0..',
+      '.....'],
+     ['.....',
+      '.....',
+      '.000.',
+      '...0.',
+      '.....'],
+     ['.....',
+      '..0..',
+      '..0..',
+      '.00..',
+      '.....']]
+
+L = [['.....',
+      '...0.',
+      '.000.',
+      '.....',
+      '.....'],
+     ['.....',
+      '..0..',
+      '..0..',
+      '..00.',
+      '.....'],
+     ['.....',
+      '.....',
+      '.000.',
+      '.0...',
+      '.....'],
+     ['.....',
+      '.00..',
+      '..0..',
+      '..0..',
+      '.....']]
+
+T = [['.....',
+      '..0..',
+      '.000.',
+      '.....',
+      '.....'],
+     ['.....',
+      '..0..',
+      '..00.',
+      '..0..',
+      '.....'],
+     ['.....',
+      '.....',
+      '.000.',
+      '..0..',
+      '.....'],
+     ['.....',
+      '..0..',
+      '.00..',
+      '..0..',
+      '.....']]
+
+# List of shapes and their colors
+shapes = [S, Z, I, O, J, L, T]
+shape_colors = [
+    (0, 255, 0),     # Green
+    (255, 0, 0),     # Red
+    (0, 255, 255),   # Cyan
+    (255, 255, 0),   # Yellow
+    (255, 165, 0),   # Orange
+    (0, 0, 255),     # Blue
+    (128, 0, 128)    # Purple
+]
+
+
+class Shape:
+    # Everything the game needs about one tetromino, compiled once from its
+    # 5x5 templates. Offsets are relative to the piece's (x, y) anchor; row
+    # masks cover rows min_dy..max_dy with bit 0 at column min_dx.
+    def __init__(self, kind, templates, color):
+        self.kind = kind
+        self.color = color
+        self.offsets = tuple(
+            tuple((j - 2, i - 4)
+                  for i, line in enumerate(template)
+                  for j, char in enumerate(line) if char == '0')
+            for template in templates
+        )
+        self.extents = tuple(
+            (min(dx for dx, _ in cells), max(dx for dx, _ in cells),
+             min(dy for _, dy in cells), max(dy for _, dy in cells))
+            for cells in self.offsets
+        )
+        self.row_masks = tuple(
+            tuple(sum(1 << (dx - min_dx) for dx, dy in cells if dy == row)
+                  for row in range(min_dy, max_dy + 1))
+            for cells, (min_dx, _, min_dy, max_dy) in zip(self.offsets, self.extents)
+        )
+        self.rotations = len(self.offsets)
+
+
+shape_registry = tuple(
+    Shape(kind, templates, color)
+    for kind, (templates, color) in enumerate(zip(shapes, shape_colors))
+)
+
+
+class Piece:
+    def __init__(self, column, row, kind):
+        self.x = column
+        self.y = row
+        self.kind = kind
+        self.rotation = 0
+
+    @property
+    def shape(self):
+        return shape_registry[self.kind]
+
+    @property
+    def color(self):
+        return shape_colors[self.kind]
+
+    def cells(self):
+        x, y = self.x, self.y
+        shape = shape_registry[self.kind]
+        return [(x + dx, y + dy)
+                for dx, dy in shape.offsets[self.rotation % shape.rotations]]
+
+
+class Board:
+    # One integer bitmask per row (bit x set = column x occupied) plus a
+    # parallel colour plane that is only read when drawing.
+    def __init__(self):
+        self.rows = [0] * rows
+        self.colors = [[empty] * columns for _ in range(rows)]
+        self.overflow = False
+
+    @classmethod
+    def from_locked(cls, locked_positions):
+        board = cls()
+        for (x, y), color in locked_positions.items():
+            board.set(x, y, color)
+        return board
+
+    @classmethod
+    def from_grid(cls, grid):
+        board = cls()
+        for y, row in enumerate(grid):
+            for x, color in enumerate(row):
+                if color != empty:
+                    board.set(x, y, color)
+        return board
+
+    def set(self, x, y, color):
+        if y < 0:
+            # Locked above the visible field, which ends the game
+            self.overflow = True
+            return
+        self.rows[y] |= 1 << x
+        self.colors[y][x] = color
+
+    def fits(self, positions):
+        # Cells above the top edge are always free, as in the original rules
+        masks = self.rows
+        for x, y in positions:
+            if y < 0:
+                continue
+            if y >= rows or not 0 <= x < columns or masks[y] >> x & 1:
+                return False
+        return True
+
+    def fits_shape(self, kind, rotation, x, y):
+        # Same rules as fits(), but a whole piece row is tested per mask op
+        shape = shape_registry[kind]
+        rotation %= shape.rotations
+        min_dx, max_dx, min_dy, _ = shape.extents[rotation]
+        left = x + min_dx
+        if left >= 0 and x + max_dx < columns:
+            # Common case: the piece is horizontally inside the field
+            masks = self.rows
+            row = y + min_dy
+            for bits in shape.row_masks[rotation]:
+                if row >= 0:
+                    if row >= rows or masks[row] & bits << left:
+                        return False
+                row += 1
+            return True
+        # Partly outside the walls: only rows above the top edge may stick out
+        return self.fits([(x + dx, y + dy) for dx, dy in shape.offsets[rotation]])
+
+    def fits_piece(self, piece):
+        return self.fits_shape(piece.kind, piece.rotation, piece.x, piece.y)
+
+    def lock(self, positions, color):
+        for x, y in positions:
+            self.set(x, y, color)
+
+    def clear_rows(self):
+        masks = self.rows
+        if full_row not in masks:
+            return 0
+        kept = [y for y in range(rows) if masks[y] != full_row]
+        cleared = rows - len(kept)
+        self.rows = [0] * cleared + [masks[y] for y in kept]
+        self.colors = ([[empty] * columns for _ in range(cleared)]
+                       + [self.colors[y] for y in kept])
+        return cleared
+
+    def lost(self):
+        return self.overflow or self.rows[0] != 0
+
+    def to_locked(self):
+        return {
+            (x, y): self.colors[y][x]
+            for y in range(rows) for x in range(columns)
+            if self.rows[y] >> x & 1
+        }
+
+
+# Player inputs as (dx, dy, rotation) nudges, matching the arrow-key handlers
+moves = {
+    'left': (-1, 0, 0),
+    'right': (1, 0, 0),
+    'down': (0, 1, 0),
+    'rotate': (0, 0, 1),
+}
+actions = tuple(moves)
+
+
+class TetrisEngine:
+    # Deterministic, display-free game. Time only advances through tick();
+    # step() is one input followed by one frame. Both return a list of
+    # ('lock', kind), ('clear', rows) and ('game_over', score) events.
+    # gravity and lock_delay are counted in frames (logic ticks).
+    def __init__(self, seed=None, gravity=16, lock_delay=0):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.gravity = gravity   # frames per row of fall
+        self.lock_delay = lock_delay   # extra frames a landed piece may still move
+        self.board = Board()
+        self.current = self.spawn()
+        self.next = self.spawn()
+        self.score = 0
+        self.lines = 0
+        self.frame = 0
+        self.fall_timer = 0
+        self.lock_timer = 0
+        self.grounded = False
+        self.game_over = False
+
+    def spawn(self):
+        return Piece(5, 0, self.rng.randrange(len(shapes)))
+
+    def snapshot(self):
+        # Everything needed to resume the game later, RNG included
+        board, piece = self.board, self.current
+        return (tuple(board.rows), tuple(tuple(row) for row in board.colors), board.overflow,
+                (piece.kind, piece.x, piece.y, piece.rotation), self.next.kind,
+                self.rng.getstate(), self.score, self.lines, self.frame,
+                self.fall_timer, self.lock_timer, self.grounded, self.game_over)
+
+    def restore(self, state):
+        (masks, colors, overflow, (kind, x, y, rotation), next_kind, rng_state, self.score,
+         self.lines, self.frame, self.fall_timer, self.lock_timer, self.grounded,
+         self.game_over) = state
+        self.board.rows = list(masks)
+        self.board.colors = [list(row) for row in colors]
+        self.board.overflow = overflow
+        self.current = Piece(x, y, kind)
+        self.current.rotation = rotation
+        self.next = Piece(5, 0, next_kind)
+        self.rng.setstate(rng_state)
+
+    def apply(self, action):
+        # Returns whether the input moved the piece
+        if self.game_over or action is None:
+            return False
+        piece = self.current
+        dx, dy, turn = moves[action]
+        x, y, rotation = piece.x, piece.y, piece.rotation
+        piece.x += dx
+        piece.y += dy
+        piece.rotation = (rotation + turn) % piece.shape.rotations
+        if self.board.fits_piece(piece):
+            if self.grounded:
+                # Moved off a ledge: gravity takes over again
+                piece.y += 1
+                self.grounded = not self.board.fits_piece(piece)
+                piece.y -= 1
+            return True
+        piece.x, piece.y, piece.rotation = x, y, rotation
+        return False
+
+    def step(self, action=None):
+        self.apply(action)
+        return self.tick(1)
+
+    def tick(self, n_frames=1):
+        events = []
+        while n_frames > 0 and not self.game_over:
+            if self.grounded:
+                wait = self.lock_delay - self.lock_timer
+                if wait > n_frames:
+                    self.lock_timer += n_frames
+                    self.frame += n_frames
+                    break
+                self.frame += wait
+                n_frames -= wait
+                events.extend(self.lock())
+                continue
+            wait = self.gravity - self.fall_timer
+            if wait > n_frames:
+                self.fall_timer += n_frames
+                self.frame += n_frames
+                break
+            # Jump straight to the next gravity step instead of looping per frame
+            self.frame += wait
+            n_frames -= wait
+            self.fall_timer = 0
+            events.extend(self.fall())
+        return events
+
+    def fall(self):
+        piece = self.current
+        piece.y += 1
+        if self.board.fits_piece(piece):
+            return []
+        piece.y -= 1
+        if self.lock_delay:
+            self.grounded = True
+            self.lock_timer = 0
+            return []
+        return self.lock()
+
+    def drop(self):
+        # Hard drop: fall to the resting row and lock straight away
+        piece = self.current
+        while self.board.fits_piece(piece):
+            piece.y += 1
+        piece.y -= 1
+        return self.lock()
+
+    def lock(self):
+        self.grounded = False
+        self.lock_timer = 0
+        piece = self.current
+        self.board.lock(piece.cells(), piece.color)
+        events = [('lock', piece.kind)]
+        cleared = self.board.clear_rows()
+        if cleared:
+            self.lines += cleared
+            self.score += cleared * 10
+            events.append(('clear', cleared))
+        self.current = self.next
+        self.next = self.spawn()
+        if self.board.lost():
+            self.game_over = True
+            events.append(('game_over', self.score))
+        return events
+
+
+# Placement search. Anchor rows 0..y_limit-1 are tracked as bits of one int
+# per (rotation, column), so a whole column of states is tested at once.
+y_limit = rows + 4
+_y_span = (1 << y_limit) - 1
+_floor = 0xff << rows   # rows below the field count as occupied
+_x_pad = 3
+
+
+class Placement:
+    def __init__(self, search, rotation, x, y):
+        self.search = search
+        self.kind = search.kind
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+
+    @property
+    def path(self):
+        # Shortest list of inputs from the spawn position, built on first use
+        return self.search.path_to(self.rotation, self.x, self.y)
+
+    def cells(self):
+        return [(self.x + dx, self.y + dy)
+                for dx, dy in shape_registry[self.kind].offsets[self.rotation]]
+
+
+class PlacementSearch:
+    # Every final resting position reachable with the arrow-key inputs.
+    # Pieces are kept between the side walls, even above the top edge.
+    def __init__(self, masks, kind, x=5, y=0, rotation=0):
+        shape = shape_registry[kind]
+        self.kind = kind
+        self.rotations = shape.rotations
+        self.start = (rotation % shape.rotations, x, y)
+        occupied = [_floor] * columns
+        for row, mask in enumerate(masks):
+            while mask:
+                low = mask & -mask
+                occupied[low.bit_length() - 1] |= 1 << row
+                mask ^= low
+        # valid[rotation][x + _x_pad] has bit y set when the piece fits there
+        self.valid = []
+        for cells, (min_dx, max_dx, _, _) in zip(shape.offsets, shape.extents):
+            table = [0] * (columns + 2 * _x_pad)
+            for column in range(-min_dx, columns - max_dx):
+                blocked = 0
+                for dx, dy in cells:
+                    blocked |= occupied[column + dx] << -dy
+                table[column + _x_pad] = ~blocked & _y_span
+            self.valid.append(table)
+        self.reach = self.flood()
+        self._parents = None
+
+    def flood(self):
+        valid = self.valid
+        rotation, x, y = self.start
+        reach = [[0] * len(table) for table in valid]
+        if not 0 <= y < y_limit or not valid[rotation][x + _x_pad] >> y & 1:
+            return reach
+        reach[rotation][x + _x_pad] = 1 << y
+        stack = [(rotation, x + _x_pad)]
+        while stack:
+            rotation, i = stack.pop()
+            free = valid[rotation][i]
+            seed = reach[rotation][i]
+            # Extend every reached row straight down through free rows: the
+            # carry of free + seed clears exactly the runs below each seed bit
+            bits = (free & ~(free + seed)) | seed
+            reach[rotation][i] = bits
+            turned = (rotation + 1) % self.rotations
+            for r, j in ((rotation, i - 1), (rotation, i + 1), (turned, i)):
+                new = bits & valid[r][j] & ~reach[r][j]
+                if new:
+                    reach[r][j] |= new
+                    stack.append((r, j))
+        return reach
+
+    def placements(self):
+        found = []
+        for rotation, (table, reached) in enumerate(zip(self.valid, self.reach)):
+            for i, bits in enumerate(reached):
+                # Resting: reachable here but blocked one row further down
+                rest = bits & ~(table[i] >> 1)
+                while rest:
+                    low = rest & -rest
+                    found.append(Placement(self, rotation, i - _x_pad, low.bit_length() - 1))
+                    rest ^= low
+        return found
+
+    def path_to(self, rotation, x, y):
+        if self._parents is None:
+            self._parents = self.shortest_paths()
+        if (rotation, x, y) not in self._parents:
+            return None
+        path = []
+        state = (rotation, x, y)
+        while self._parents[state] is not None:
+            state, action = self._parents[state]
+            path.append(action)
+        path.reverse()
+        return path
+
+    def shortest_paths(self):
+        valid = self.valid
+        parents = {self.start: None}
+        queue = deque([self.start])
+        while queue:
+            state = queue.popleft()
+            rotation, x, y = state
+            for action, nxt in (('left', (rotation, x - 1, y)),
+                                ('right', (rotation, x + 1, y)),
+                                ('down', (rotation, x, y + 1)),
+                                ('rotate', ((rotation + 1) % self.rotations, x, y))):
+                r, nx, ny = nxt
+                if nxt not in parents and valid[r][nx + _x_pad] >> ny & 1:
+                    parents[nxt] = (state, action)
+                    queue.append(nxt)
+        return parents
+
+
+def find_placements(board, piece):
+    # board: a Board or a sequence of row masks
+    masks = board.rows if isinstance(board, Board) else board
+    return PlacementSearch(masks, piece.kind, piece.x, piece.y, piece.rotation).placements()
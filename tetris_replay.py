@@ -0,0 +1,171 @@
+import struct
+import sys
+import time
+
+from tetris_core import TetrisEngine, actions
+
+# Compact Tetris replays: the RNG seed and engine settings, then every input
+# that moved the piece as a varint of (frames since the previous input << 2 |
+# action). The engine is deterministic, so that is enough to rebuild any frame.
+
+magic = b'TRPL'
+version = 1
+_header = struct.Struct('<4sBIHHI')   # magic, version, seed, gravity, lock delay, score
+_action_codes = {action: code for code, action in enumerate(actions)}
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    def __init__(self, seed, gravity, lock_delay, inputs=(), frames=0, score=0):
+        self.seed = seed
+        self.gravity = gravity
+        self.lock_delay = lock_delay
+        self.inputs = list(inputs)   # (frame, action), in order
+        self.frames = frames         # frame the recording ended on
+        self.score = score
+
+    def new_engine(self):
+        return TetrisEngine(self.seed, self.gravity, self.lock_delay)
+
+    def to_bytes(self):
+        out = bytearray(_header.pack(magic, version, self.seed, self.gravity,
+                                     self.lock_delay, self.score))
+        write_varint(out, self.frames)
+        write_varint(out, len(self.inputs))
+        previous = 0
+        for frame, action in self.inputs:
+            write_varint(out, (frame - previous) << 2 | _action_codes[action])
+            previous = frame
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        tag, file_version, seed, gravity, lock_delay, score = _header.unpack_from(data)
+        if tag != magic or file_version != version:
+            raise ValueError('not a Tetris replay')
+        pos = _header.size
+        frames, pos = read_varint(data, pos)
+        count, pos = read_varint(data, pos)
+        inputs = []
+        frame = 0
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            frame += value >> 2
+            inputs.append((frame, actions[value & 3]))
+        return cls(seed, gravity, lock_delay, inputs, frames, score)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    # Wraps an engine; route inputs through apply() and call finish() at the end
+    def __init__(self, engine):
+        if not isinstance(engine.seed, int):
+            raise ValueError('recording needs an engine with an integer seed')
+        self.engine = engine
+        self.replay = Replay(engine.seed, engine.gravity, engine.lock_delay)
+
+    def apply(self, action):
+        moved = self.engine.apply(action)
+        if moved:
+            # Inputs that did nothing are not needed to reproduce the game
+            self.replay.inputs.append((self.engine.frame, action))
+        return moved
+
+    def finish(self):
+        self.replay.frames = self.engine.frame
+        self.replay.score = self.engine.score
+        return self.replay
+
+
+class Player:
+    # Re-simulates a replay. Snapshots taken every snapshot_interval frames on
+    # load make seek() cost at most one interval of simulation; pass None to
+    # skip them when the replay is only played through once.
+    def __init__(self, replay, snapshot_interval=600):
+        self.replay = replay
+        self.interval = snapshot_interval
+        self.engine = replay.new_engine()
+        self.next_input = 0
+        self.snapshots = [(self.engine.snapshot(), 0)]
+        if snapshot_interval:
+            while self.advance(snapshot_interval) is not None and not self.engine.game_over:
+                self.snapshots.append((self.engine.snapshot(), self.next_input))
+            self.seek(0)
+
+    @property
+    def frame(self):
+        return self.engine.frame
+
+    def advance(self, n_frames):
+        # Plays n_frames forward; returns the engine events, or None at the end
+        engine, inputs = self.engine, self.replay.inputs
+        if engine.frame >= self.replay.frames:
+            return None
+        target = min(engine.frame + n_frames, self.replay.frames)
+        events = []
+        while engine.frame < target:
+            while self.next_input < len(inputs) and inputs[self.next_input][0] == engine.frame:
+                engine.apply(inputs[self.next_input][1])
+                self.next_input += 1
+            if self.next_input < len(inputs):
+                stop = min(target, inputs[self.next_input][0])
+            else:
+                stop = target
+            events.extend(engine.tick(stop - engine.frame))
+            if engine.game_over:
+                break
+        return events
+
+    def seek(self, frame):
+        frame = max(0, min(frame, self.replay.frames))
+        index = frame // self.interval if self.interval else 0
+        snapshot, next_input = self.snapshots[min(index, len(self.snapshots) - 1)]
+        self.engine.restore(snapshot)
+        self.next_input = next_input
+        self.advance(frame - self.engine.frame)
+
+    def run(self):
+        # Headless, at full speed, to the end of the recording
+        self.advance(self.replay.frames - self.engine.frame)
+        return self.engine
+
+
+def verify(replay):
+    # True when re-simulating the inputs reproduces the recorded score
+    engine = Player(replay, None).run()
+    return engine.score == replay.score and engine.frame == replay.frames
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        replay = Replay.load(path)
+        start = time.perf_counter()
+        ok = verify(replay)
+        elapsed = (time.perf_counter() - start) * 1000
+        status = 'ok' if ok else 'MISMATCH'
+        print(f'{path}: score {replay.score}, {replay.frames} frames, {status} ({elapsed:.1f} ms)')